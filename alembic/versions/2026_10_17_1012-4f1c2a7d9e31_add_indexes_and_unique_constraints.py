@@ -0,0 +1,77 @@
+"""add indexes and unique constraints for hot lookups
+
+Revision ID: 4f1c2a7d9e31
+Revises: 66221b312dd1
+Create Date: 2026-10-17 10:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1c2a7d9e31'
+down_revision = '66221b312dd1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # keep only the latest active game of a chat
+    op.execute("""
+        UPDATE games SET in_process = false, ended_at = now()
+        WHERE in_process AND id NOT IN (
+            SELECT max(id) FROM games WHERE in_process GROUP BY peer_id
+        )
+    """)
+    # merge users created twice for the same vk_id into the first one
+    op.execute("""
+        CREATE TEMPORARY TABLE duplicate_users ON COMMIT DROP AS
+        SELECT id, min(id) OVER (PARTITION BY vk_id) AS kept_id
+        FROM users
+    """)
+    op.execute("DELETE FROM duplicate_users WHERE id = kept_id")
+    for table in ('statistics', 'game_answers'):
+        op.execute(f"""
+            UPDATE {table} SET user_id = duplicate_users.kept_id
+            FROM duplicate_users WHERE {table}.user_id = duplicate_users.id
+        """)
+    op.execute("""
+        DELETE FROM users USING duplicate_users
+        WHERE users.id = duplicate_users.id
+    """)
+    # keep the first statistics row of a player in a game
+    op.execute("""
+        DELETE FROM statistics WHERE id NOT IN (
+            SELECT min(id) FROM statistics GROUP BY game_id, user_id
+        )
+    """)
+
+    op.create_index('ix_games_peer_id', 'games', ['peer_id'])
+    op.create_index(
+        'uq_games_peer_id_in_process', 'games', ['peer_id'],
+        unique=True, postgresql_where=sa.text('in_process'),
+    )
+    op.create_unique_constraint('uq_users_vk_id', 'users', ['vk_id'])
+    op.create_unique_constraint(
+        'uq_statistics_game_id_user_id', 'statistics', ['game_id', 'user_id']
+    )
+    op.create_index('ix_statistics_user_id', 'statistics', ['user_id'])
+    op.create_index(
+        'ix_roadmaps_game_id_status', 'roadmaps', ['game_id', 'status']
+    )
+    op.create_index(
+        'ix_answers_question_id_title', 'answers', ['question_id', 'title']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_answers_question_id_title', table_name='answers')
+    op.drop_index('ix_roadmaps_game_id_status', table_name='roadmaps')
+    op.drop_index('ix_statistics_user_id', table_name='statistics')
+    op.drop_constraint(
+        'uq_statistics_game_id_user_id', 'statistics', type_='unique'
+    )
+    op.drop_constraint('uq_users_vk_id', 'users', type_='unique')
+    op.drop_index('uq_games_peer_id_in_process', table_name='games')
+    op.drop_index('ix_games_peer_id', table_name='games')
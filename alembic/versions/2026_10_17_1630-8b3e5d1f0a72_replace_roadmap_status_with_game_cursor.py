@@ -0,0 +1,60 @@
+"""replace roadmap status with a current_index cursor on games
+
+Revision ID: 8b3e5d1f0a72
+Revises: 4f1c2a7d9e31
+Create Date: 2026-10-17 16:30:12.274915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b3e5d1f0a72'
+down_revision = '4f1c2a7d9e31'
+branch_labels = None
+depends_on = None
+
+ROADMAP_POSITIONS = """
+    SELECT id, game_id,
+        row_number() OVER (PARTITION BY game_id ORDER BY id) - 1 AS position
+    FROM roadmaps
+"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        'games',
+        sa.Column(
+            'current_index', sa.Integer(), nullable=False, server_default='0'
+        ),
+    )
+    op.execute(f"""
+        UPDATE games SET current_index = positions.position
+        FROM ({ROADMAP_POSITIONS}) AS positions
+        JOIN roadmaps ON roadmaps.id = positions.id
+        WHERE games.id = positions.game_id AND roadmaps.status = 1
+    """)
+    op.drop_index('ix_roadmaps_game_id_status', table_name='roadmaps')
+    op.drop_column('roadmaps', 'status')
+    op.create_index('ix_roadmaps_game_id_id', 'roadmaps', ['game_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_roadmaps_game_id_id', table_name='roadmaps')
+    op.add_column(
+        'roadmaps',
+        sa.Column('status', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.alter_column('roadmaps', 'status', server_default=None)
+    op.execute(f"""
+        UPDATE roadmaps SET status = 1
+        FROM ({ROADMAP_POSITIONS}) AS positions
+        JOIN games ON games.id = positions.game_id
+        WHERE roadmaps.id = positions.id
+            AND positions.position = games.current_index
+    """)
+    op.create_index(
+        'ix_roadmaps_game_id_status', 'roadmaps', ['game_id', 'status']
+    )
+    op.drop_column('games', 'current_index')
@@ -0,0 +1,93 @@
+"""add user and chat leaderboards
+
+Revision ID: c4a7e2b9d615
+Revises: 8b3e5d1f0a72
+Create Date: 2026-10-17 17:12:05.648230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e2b9d615'
+down_revision = '8b3e5d1f0a72'
+branch_labels = None
+depends_on = None
+
+LEADERBOARD_COLUMNS = (
+    'games_played', 'wins', 'points', 'right_answers', 'failures'
+)
+# totals of the games already finished
+FINISHED_RESULTS = """
+    SELECT games.peer_id, statistics.user_id,
+        count(*) AS games_played,
+        count(*) FILTER (WHERE statistics.is_winner) AS wins,
+        sum(statistics.points) AS points,
+        coalesce(sum(answers.right_answers), 0) AS right_answers,
+        sum(statistics.failures) AS failures
+    FROM statistics
+    JOIN games ON games.id = statistics.game_id AND NOT games.in_process
+    LEFT JOIN (
+        SELECT game_id, user_id, count(*) AS right_answers
+        FROM game_answers GROUP BY game_id, user_id
+    ) AS answers ON answers.game_id = statistics.game_id
+        AND answers.user_id = statistics.user_id
+"""
+
+
+def leaderboard_columns() -> list[sa.Column]:
+    return [
+        sa.Column(name, sa.Integer(), nullable=False)
+        for name in LEADERBOARD_COLUMNS
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_leaderboard',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        *leaderboard_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_index(
+        'ix_user_leaderboard_points_user_id',
+        'user_leaderboard', ['points', 'user_id'],
+    )
+    op.create_table(
+        'chat_leaderboard',
+        sa.Column('peer_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        *leaderboard_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('peer_id', 'user_id'),
+    )
+    op.create_index(
+        'ix_chat_leaderboard_peer_id_points_user_id',
+        'chat_leaderboard', ['peer_id', 'points', 'user_id'],
+    )
+
+    columns = ", ".join(LEADERBOARD_COLUMNS)
+    totals = ", ".join(f"sum({name})" for name in LEADERBOARD_COLUMNS)
+    op.execute(f"""
+        INSERT INTO chat_leaderboard (peer_id, user_id, {columns})
+        {FINISHED_RESULTS}
+        GROUP BY games.peer_id, statistics.user_id
+    """)
+    op.execute(f"""
+        INSERT INTO user_leaderboard (user_id, {columns})
+        SELECT user_id, {totals} FROM chat_leaderboard GROUP BY user_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_chat_leaderboard_peer_id_points_user_id',
+        table_name='chat_leaderboard',
+    )
+    op.drop_table('chat_leaderboard')
+    op.drop_index(
+        'ix_user_leaderboard_points_user_id', table_name='user_leaderboard'
+    )
+    op.drop_table('user_leaderboard')
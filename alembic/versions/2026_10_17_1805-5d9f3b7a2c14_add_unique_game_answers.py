@@ -0,0 +1,35 @@
+"""make an answer saved once per game
+
+Revision ID: 5d9f3b7a2c14
+Revises: c4a7e2b9d615
+Create Date: 2026-10-17 18:05:37.912604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d9f3b7a2c14'
+down_revision = 'c4a7e2b9d615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # keep the first row of an answer in a game
+    op.execute("""
+        DELETE FROM game_answers WHERE id NOT IN (
+            SELECT min(id) FROM game_answers GROUP BY game_id, answer_id
+        )
+    """)
+    op.create_unique_constraint(
+        'uq_game_answers_game_id_answer_id',
+        'game_answers', ['game_id', 'answer_id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        'uq_game_answers_game_id_answer_id', 'game_answers', type_='unique'
+    )
@@ -5,7 +5,10 @@ if typing.TYPE_CHECKING:
 
 
 def setup_routes(app: "Application"):
-    from app.admin.views import AdminLoginView, AdminCurrentView
+    from app.admin.views import (
+        AdminLoginView, AdminCurrentView, DatabasePoolView
+    )
 
     app.router.add_view("/admin.login", AdminLoginView)
     app.router.add_view("/admin.current", AdminCurrentView)
+    app.router.add_view("/admin.database", DatabasePoolView)
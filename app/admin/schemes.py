@@ -5,3 +5,14 @@ class AdminSchema(Schema):
     id = fields.Int(required=False)
     email = fields.Str(required=True)
     password = fields.Str(required=True, load_only=True)
+
+
+class DatabasePoolSchema(Schema):
+    size = fields.Int()
+    checked_in = fields.Int()
+    checked_out = fields.Int()
+    overflow = fields.Int()
+    checkouts = fields.Int()
+    timeouts = fields.Int()
+    wait_time_avg = fields.Float()
+    wait_time_max = fields.Float()
@@ -2,7 +2,7 @@ from aiohttp.web import HTTPForbidden
 from aiohttp_apispec import request_schema, response_schema
 from aiohttp_session import new_session
 
-from app.admin.schemes import AdminSchema
+from app.admin.schemes import AdminSchema, DatabasePoolSchema
 from app.web.app import View
 from app.web.utils import json_response
 from app.web.mixins import AuthRequiredMixin
@@ -28,3 +28,11 @@ class AdminCurrentView(AuthRequiredMixin, View):
     @response_schema(AdminSchema, 200)
     async def get(self):
         return json_response(data=AdminSchema().dump(self.request.admin))
+
+
+class DatabasePoolView(AuthRequiredMixin, View):
+    @response_schema(DatabasePoolSchema, 200)
+    async def get(self):
+        return json_response(
+            data=DatabasePoolSchema().dump(self.database.get_pool_stats())
+        )
@@ -0,0 +1,11 @@
+import typing
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+def setup_routes(app: "Application"):
+    from app.bot.views import VkCallbackView, MetricsView
+
+    app.router.add_view("/vk.callback", VkCallbackView)
+    app.router.add_view("/metrics", MetricsView)
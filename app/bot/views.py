@@ -0,0 +1,42 @@
+from logging import getLogger
+
+from aiohttp.web import Response
+from aiohttp.web_exceptions import HTTPForbidden, HTTPInternalServerError
+
+from app.web.app import View
+
+logger = getLogger("callback")
+
+
+class VkCallbackView(View):
+    async def post(self):
+        data = await self.request.json()
+        config = self.request.app.config.bot
+        if data.get("group_id") != config.group_id:
+            raise HTTPForbidden
+        if config.callback_secret and (
+            data.get("secret") != config.callback_secret
+        ):
+            raise HTTPForbidden
+
+        if data.get("type") == "confirmation":
+            if not config.callback_confirmation:
+                logger.error("bot.callback_confirmation is not set")
+                raise HTTPInternalServerError(
+                    text="callback confirmation is not configured",
+                )
+            return Response(text=config.callback_confirmation)
+
+        # VK resends updates not acknowledged in time, so the ack
+        # never waits for the dispatch queue, a full one sheds them
+        if not self.store.vk_api.push_updates(raw_updates=[data]):
+            logger.warning(f"dispatch queue is full, drop {data.get('type')}")
+        return Response(text="ok")
+
+
+class MetricsView(View):
+    async def get(self):
+        return Response(
+            text=self.store.tracing.render(),
+            content_type="text/plain",
+        )
@@ -1,5 +1,5 @@
 import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -16,6 +16,10 @@ class UserDC:
             return f"{self.first_name} {self.last_name}"
         return None
 
+    @property
+    def display_name(self) -> str:
+        return self.full_name or f"id{self.vk_id}"
+
 
 @dataclass
 class UserStatisticsDC:
@@ -36,6 +40,7 @@ class GameDC:
     in_process: bool
     started_at: datetime.datetime
     ended_at: datetime.datetime | None = None
+    current_index: int = 0
 
 
 @dataclass
@@ -67,3 +72,43 @@ class GameAnswerDC:
     game_id: int
     user_id: int
     answer_id: int
+
+
+@dataclass
+class LeaderboardEntryDC:
+    user: UserDC
+    games_played: int
+    wins: int
+    points: int
+    right_answers: int
+    failures: int
+
+    @property
+    def accuracy(self) -> float:
+        guesses = self.right_answers + self.failures
+        if not guesses:
+            return 0.0
+        return self.right_answers / guesses
+
+
+@dataclass
+class PlayerStateDC:
+    user: UserDC
+    is_creator: bool = False
+    points: int = 0
+    failures: int = 0
+    is_lost: bool = False
+
+
+@dataclass
+class GameStateDC:
+    game: GameDC
+    questions: list[QuestionDC]
+    question_index: int = 0
+    players: dict[int, PlayerStateDC] = field(default_factory=dict)
+
+    @property
+    def active_question(self) -> QuestionDC | None:
+        if self.question_index < len(self.questions):
+            return self.questions[self.question_index]
+        return None
@@ -1,16 +1,23 @@
 import datetime
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import ForeignKey, String, Index, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.store.database.sqlalchemy_base import Base
 from app.game.dataclasses import (
     UserDC, GameDC, QuestionDC, GameAnswerDC,
-    AnswerDC, UserStatisticsDC, RoadmapDC
+    AnswerDC, UserStatisticsDC, RoadmapDC, LeaderboardEntryDC
 )
 
 
 class GameModel(Base):
     __tablename__ = "games"
+    __table_args__ = (
+        Index("ix_games_peer_id", "peer_id"),
+        Index(
+            "uq_games_peer_id_in_process", "peer_id",
+            unique=True, postgresql_where=text("in_process"),
+        ),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     peer_id: Mapped[int]
     started_at: Mapped[datetime.datetime] = mapped_column(
@@ -18,6 +25,8 @@ class GameModel(Base):
     )
     ended_at: Mapped[datetime.datetime] = mapped_column(nullable=True)
     in_process: Mapped[bool] = mapped_column(default=True)
+    # position of the active question among the game's roadmaps
+    current_index: Mapped[int] = mapped_column(default=0, server_default="0")
     roadmaps: Mapped[list["RoadmapModel"]] = relationship("RoadmapModel")
 
     def to_dataclass(self) -> GameDC:
@@ -26,12 +35,16 @@ class GameModel(Base):
             peer_id=self.peer_id,
             in_process=self.in_process,
             started_at=self.started_at,
-            ended_at=self.ended_at
+            ended_at=self.ended_at,
+            current_index=self.current_index,
         )
 
 
 class UserModel(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        UniqueConstraint("vk_id", name="uq_users_vk_id"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     vk_id: Mapped[int]
     first_name: Mapped[str] = mapped_column(String(128), nullable=True)
@@ -48,6 +61,12 @@ class UserModel(Base):
 
 class StatisticsModel(Base):
     __tablename__ = "statistics"
+    __table_args__ = (
+        UniqueConstraint(
+            "game_id", "user_id", name="uq_statistics_game_id_user_id"
+        ),
+        Index("ix_statistics_user_id", "user_id"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     game_id: Mapped[int] = mapped_column(ForeignKey("games.id"))
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -86,6 +105,9 @@ class QuestionModel(Base):
 
 class AnswerModel(Base):
     __tablename__ = "answers"
+    __table_args__ = (
+        Index("ix_answers_question_id_title", "question_id", "title"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(256))
     question_id: Mapped[int] = mapped_column(ForeignKey("questions.id"))
@@ -102,22 +124,21 @@ class AnswerModel(Base):
 
 class RoadmapModel(Base):
     __tablename__ = "roadmaps"
+    __table_args__ = (
+        Index("ix_roadmaps_game_id_id", "game_id", "id"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     game_id: Mapped[int] = mapped_column(ForeignKey("games.id"))
     question_id: Mapped[int] = mapped_column(ForeignKey("questions.id"))
-    status: Mapped[int]
-
-    def to_dataclass(self) -> RoadmapDC:
-        return RoadmapDC(
-            id=self.id,
-            game_id=self.game_id,
-            question_id=self.question_id,
-            status=self.status
-        )
 
 
 class GameAnswersModel(Base):
     __tablename__ = "game_answers"
+    __table_args__ = (
+        UniqueConstraint(
+            "game_id", "answer_id", name="uq_game_answers_game_id_answer_id"
+        ),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     game_id: Mapped[int] = mapped_column(ForeignKey("games.id"))
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -130,3 +151,48 @@ class GameAnswersModel(Base):
             user_id=self.user_id,
             answer_id=self.answer_id
         )
+
+
+class LeaderboardMixin:
+    """
+    totals of a user over finished games, added to as games end
+    """
+    games_played: Mapped[int] = mapped_column(default=0)
+    wins: Mapped[int] = mapped_column(default=0)
+    points: Mapped[int] = mapped_column(default=0)
+    right_answers: Mapped[int] = mapped_column(default=0)
+    failures: Mapped[int] = mapped_column(default=0)
+
+    def to_dataclass(self, user: UserDC) -> LeaderboardEntryDC:
+        return LeaderboardEntryDC(
+            user=user,
+            games_played=self.games_played,
+            wins=self.wins,
+            points=self.points,
+            right_answers=self.right_answers,
+            failures=self.failures,
+        )
+
+
+class UserLeaderboardModel(LeaderboardMixin, Base):
+    __tablename__ = "user_leaderboard"
+    __table_args__ = (
+        Index("ix_user_leaderboard_points_user_id", "points", "user_id"),
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id"), primary_key=True
+    )
+
+
+class ChatLeaderboardModel(LeaderboardMixin, Base):
+    __tablename__ = "chat_leaderboard"
+    __table_args__ = (
+        Index(
+            "ix_chat_leaderboard_peer_id_points_user_id",
+            "peer_id", "points", "user_id",
+        ),
+    )
+    peer_id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id"), primary_key=True
+    )
@@ -8,8 +8,7 @@ def setup_routes(app: "Application"):
     from app.game.views import (
         QuestionAddView, QuestionListView, UsersListView,
         QuestionEditView, GamesListView, RoadmapsListView,
-        UserStatisticsListView,
-
+        UserStatisticsListView, UserLeaderboardView, ChatLeaderboardView,
     )
     app.router.add_view("/questions.add", QuestionAddView)
     app.router.add_view("/questions.list", QuestionListView)
@@ -18,3 +17,5 @@ def setup_routes(app: "Application"):
     app.router.add_view("/roadmaps.list", RoadmapsListView)
     app.router.add_view("/users.list", UsersListView)
     app.router.add_view("/statistics.list", UserStatisticsListView)
+    app.router.add_view("/leaderboard.users", UserLeaderboardView)
+    app.router.add_view("/leaderboard.chat", ChatLeaderboardView)
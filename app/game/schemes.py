@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 
 
 class UserSchema(Schema):
@@ -20,6 +20,7 @@ class GameSchema(Schema):
     in_process = fields.Bool(required=True)
     started_at = fields.DateTime(required=True)
     ended_at = fields.DateTime(required=False)
+    current_index = fields.Int(required=False)
     roadmaps = fields.Nested(RoadmapSchema, many=True)
 
 
@@ -33,6 +34,16 @@ class StatisticsSchema(Schema):
     is_lost = fields.Bool(required=True)
 
 
+class LeaderboardEntrySchema(Schema):
+    user = fields.Nested(UserSchema)
+    games_played = fields.Int(required=True)
+    wins = fields.Int(required=True)
+    points = fields.Int(required=True)
+    right_answers = fields.Int(required=True)
+    failures = fields.Int(required=True)
+    accuracy = fields.Float(required=True)
+
+
 class AnswerSchema(Schema):
     id = fields.Int(required=False)
     title = fields.Str(required=True)
@@ -72,6 +83,14 @@ class StatisticsListSchema(Schema):
     statistics = fields.Nested(StatisticsSchema, many=True)
 
 
+class LeaderboardSchema(Schema):
+    entries = fields.Nested(LeaderboardEntrySchema, many=True)
+    # cursor of the next page, passed back as after_points
+    # and after_user_id
+    next_points = fields.Int(allow_none=True)
+    next_user_id = fields.Int(allow_none=True)
+
+
 class ListQuerySchema(Schema):
     page = fields.Int()
 
@@ -95,3 +114,13 @@ class RoadmapListQuerySchema(ListQuerySchema):
 class StatisticsListQuerySchema(ListQuerySchema):
     user_id = fields.Int()
     game_id = fields.Int()
+
+
+class LeaderboardQuerySchema(Schema):
+    limit = fields.Int(validate=validate.Range(min=1, max=100))
+    after_points = fields.Int()
+    after_user_id = fields.Int()
+
+
+class ChatLeaderboardQuerySchema(LeaderboardQuerySchema):
+    peer_id = fields.Int(required=True)
@@ -10,7 +10,8 @@ from app.game.schemes import (
     QuestionSchema, QuestionListSchema, StatisticsListQuerySchema,
     QuestionListQuerySchema, GameListQuerySchema, GameListSchema,
     UserListSchema, RoadmapListSchema, QuestionEditSchema,
-    StatisticsListSchema, UserListQuerySchema, RoadmapListQuerySchema
+    StatisticsListSchema, UserListQuerySchema, RoadmapListQuerySchema,
+    LeaderboardSchema, LeaderboardQuerySchema, ChatLeaderboardQuerySchema,
 )
 from app.game.dataclasses import AnswerDC
 
@@ -31,6 +32,8 @@ class QuestionAddView(AuthRequiredMixin, View):
             title=title,
             answers=answers
         )
+        self.store.question_bank.put(question=question)
+        await self.store.shards.question_changed(question_id=question.id)
         return json_response(data=QuestionSchema().dump(question))
 
 
@@ -51,6 +54,9 @@ class QuestionEditView(AuthRequiredMixin, View):
             title=question_dict["title"],
             answers=answers
         )
+        await self.store.question_bank.reload_question(question_id=question.id)
+        self.store.state.forget_question(question_id=question.id)
+        await self.store.shards.question_changed(question_id=question.id)
         return json_response(data=QuestionSchema().dump(question))
 
 
@@ -123,3 +129,51 @@ class UserStatisticsListView(AuthRequiredMixin, View):
         return json_response(StatisticsListSchema().dump(
             {"user_statistics": user_statistics}
         ))
+
+
+LEADERBOARD_PAGE_SIZE = 10
+
+
+async def leaderboard_response(
+    view: View,
+    query_dict: dict,
+    peer_id: int | None = None,
+):
+    after = None
+    if "after_points" in query_dict and "after_user_id" in query_dict:
+        after = (query_dict["after_points"], query_dict["after_user_id"])
+    limit = query_dict.get("limit", LEADERBOARD_PAGE_SIZE)
+    entries = await view.store.game.list_leaderboard(
+        limit=limit,
+        peer_id=peer_id,
+        after=after,
+    )
+    next_points = next_user_id = None
+    if len(entries) == limit:
+        next_points = entries[-1].points
+        next_user_id = entries[-1].user.id
+    return json_response(LeaderboardSchema().dump({
+        "entries": entries,
+        "next_points": next_points,
+        "next_user_id": next_user_id,
+    }))
+
+
+class UserLeaderboardView(AuthRequiredMixin, View):
+    @querystring_schema(LeaderboardQuerySchema)
+    @response_schema(LeaderboardSchema)
+    async def get(self):
+        query_dict = LeaderboardQuerySchema().load(self.request.query)
+        return await leaderboard_response(view=self, query_dict=query_dict)
+
+
+class ChatLeaderboardView(AuthRequiredMixin, View):
+    @querystring_schema(ChatLeaderboardQuerySchema)
+    @response_schema(LeaderboardSchema)
+    async def get(self):
+        query_dict = ChatLeaderboardQuerySchema().load(self.request.query)
+        return await leaderboard_response(
+            view=self,
+            query_dict=query_dict,
+            peer_id=query_dict["peer_id"],
+        )
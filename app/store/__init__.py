@@ -12,9 +12,19 @@ class Store:
         from app.store.vk_api.accessor import VkApiAccessor
         from app.store.game.accessor import GameAccessor
         from app.store.admin.accessor import AdminAccessor
+        from app.store.state.accessor import GameStateAccessor
+        from app.store.bot.timers import TimersManager
+        from app.store.question_bank.accessor import QuestionBankAccessor
+        from app.store.shards.accessor import ShardsAccessor
+        from app.store.tracing.accessor import TracingAccessor
 
+        self.tracing = TracingAccessor(app)
+        self.question_bank = QuestionBankAccessor(app)
+        self.state = GameStateAccessor(app)
+        self.shards = ShardsAccessor(app)
         self.vk_api = VkApiAccessor(app)
         self.tasks_manager = UpdateTasksManager(app)
+        self.timers = TimersManager(app)
         self.game = GameAccessor(app)
         self.admins = AdminAccessor(app)
 
@@ -23,4 +33,6 @@ def setup_store(app: "Application"):
     app.database = Database(app)
     app.on_startup.append(app.database.connect)
     app.store = Store(app)
+    app.on_cleanup.append(app.store.state.flush)
+    app.on_cleanup.append(app.store.vk_api.close)
     app.on_cleanup.append(app.database.disconnect)
@@ -6,8 +6,10 @@ from app.admin.models import AdminModel
 from app.admin.dataclasses import Admin
 from app.base.base_accessor import BaseAccessor
 from app.store.utils import decorate_all_methods, add_db_session_to_accessor
+from app.store.tracing.accessor import traced
 
 
+@decorate_all_methods(traced(kind="accessor"))
 @decorate_all_methods(add_db_session_to_accessor)
 class AdminAccessor(BaseAccessor):
     async def get_admin(
@@ -47,7 +49,7 @@ class AdminAccessor(BaseAccessor):
             password=sha256(password.encode()).hexdigest()
         )
         session.add(admin_model)
-        await session.commit()
+        await session.flush()
         return Admin(
             id=admin_model.id,
             email=admin_model.email,
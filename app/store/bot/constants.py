@@ -1,9 +1,23 @@
 BREAK_LINE = "%0A"
+MAX_USER_FAILURES = 3
+JOIN_TIME_SECONDS = 10
+QUESTIONS_PER_GAME = 5
+TOP_SIZE = 10
+# VK rejects longer message texts
+MAX_MESSAGE_LENGTH = 4096
 
 
 class BotTextCommands:
     create_game = "/create"
     get_info = "/info"
+    get_top = "/top"
+
+
+TEXT_COMMANDS = frozenset((
+    BotTextCommands.create_game,
+    BotTextCommands.get_info,
+    BotTextCommands.get_top,
+))
 
 
 class BotEventCommands:
@@ -15,7 +29,8 @@ class BotMessages:
         Привет! Я бот, добавляющий в ваш чат игру 100 к 1{BREAK_LINE} \
         Мои команды:{BREAK_LINE} \
         /create - команда для создания игры{BREAK_LINE} \
-        /info - команда для выводы инормации обо мне{BREAK_LINE}
+        /info - команда для выводы инормации обо мне{BREAK_LINE} \
+        /top - команда для вывода лучших игроков чата{BREAK_LINE}
     """
     create = f"""
         Игра создалась!{BREAK_LINE}
@@ -24,9 +39,20 @@ class BotMessages:
     back_timer = "Осталось {seconds} секунд..."
     time_over = "Время вышло!"
     start = "Начало игры через 5 секунд!"
+    no_questions = "Пока нет вопросов для игры"
     already_join = "Вы уже присоединились к этой игре"
     user_join = "Вы присоединились к игре"
     user_failed = "{user} неверно ответил на вопрос"
     user_lost = "{user} выбывает из игры"
     user_right = "{user} верно ответил на вопрос и получил {score} очков"
     end_game = "Игра окончена. Победитель: {user}, он набрал {score} очков"
+    end_game_without_winner = "Игра окончена. Все игроки выбыли"
+    previous_game_saving = (
+        "Предыдущая игра еще сохраняется, попробуйте создать игру позже"
+    )
+    top = "Лучшие игроки чата:"
+    top_line = (
+        "{place}. {user} - {points} очков, побед: {wins}, "
+        "точность {accuracy}%25"
+    )
+    top_empty = "В этом чате еще не закончилось ни одной игры"
@@ -1,132 +1,76 @@
 import typing
-import asyncio
 
 from app.store.bot.user import User
-from app.store.bot.message import Message
-from app.store.bot.constants import BotMessages
-from app.game.dataclasses import QuestionDC, AnswerDC, UserDC
+from app.game.dataclasses import (
+    QuestionDC, AnswerDC, GameStateDC, PlayerStateDC
+)
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
 
 class Game:
+    __slots__ = ("_app", "peer_id", "state")
+
     def __init__(self, app: "Application", peer_id: int):
         self._app = app
         self.peer_id = peer_id
-        self.id = None
-        self.in_process = False
-        self.started_at = None
+        self.state: GameStateDC | None = None
+
+    @property
+    def id(self) -> int | None:
+        if self.state:
+            return self.state.game.id
+        return None
 
     async def create(self):
-        game_data = await self._app.store.game.create_game(
+        self.state = await self._app.store.state.create_game(
             peer_id=self.peer_id,
         )
-        self.id = game_data.id
-        self.started_at = game_data.started_at
 
-    async def init(self):
-        game_data = await self._app.store.game.get_game_by_peer_id(
-            peer_id=self.peer_id,
-        )
-        if game_data:
-            self.id = game_data.id
-            self.started_at = game_data.started_at
-            self.in_process = game_data.in_process
+    def init(self):
+        self.state = self._app.store.state.get_game(peer_id=self.peer_id)
 
-    async def exists(self) -> bool:
-        game_data = await self._app.store.game.get_game_by_peer_id(
-            peer_id=self.peer_id,
-        )
-        if not game_data:
-            return False
-        return True
-
-    async def check_user_in_game(self, user: User) -> bool:
-        statistics_data = await self._app.store.game.get_user_statistics(
-            game_id=self.id,
-            user_id=user.id,
-        )
-        if statistics_data:
-            return True
-        return False
-
-    async def create_user(self, user: User):
-        await self._app.store.game.create_user_statistics(
-            user_id=user.id,
-            game_id=self.id,
-        )
+    def exists(self) -> bool:
+        return self.state is not None
 
-    async def back_timer(self, seconds: int = 10):
-        message = Message(
-            app=self._app,
-            peer_id=self.peer_id,
-            text=BotMessages.back_timer.format(seconds=seconds),
-        )
-        await message.send()
-
-        counter = seconds
-        while counter > 1:
-            counter -= 1
-            await asyncio.sleep(1)
-            await message.edit(
-                text=BotMessages.back_timer.format(seconds=counter),
-            )
-
-        await message.edit(
-            text=BotMessages.time_over,
-        )
+    def get_player(self, user: User) -> PlayerStateDC | None:
+        return self.state.players.get(user.vk_id)
 
-    async def get_active_question(self) -> QuestionDC:
-        question = await self._app.store.game.get_active_question(
-            game_id=self.id,
-        )
-        return question
+    def check_user_in_game(self, user: User) -> bool:
+        return self.get_player(user=user) is not None
 
-    async def get_answer(self, title: str) -> AnswerDC:
-        active_q = await self.get_active_question()
-        answer = await self._app.store.game.get_answer(
-            title=title,
-            question_id=active_q.id,
+    def create_user(self, user: User, is_creator: bool = False):
+        self._app.store.state.add_player(
+            game=self.state,
+            user=user.to_dataclass(),
+            is_creator=is_creator,
         )
-        return answer
 
-    async def add_fail(self, user: User):
-        await self._app.store.game.add_fail_to_user(
-            game_id=self.id,
-            user_id=user.id,
-        )
+    def get_active_question(self) -> QuestionDC | None:
+        return self.state.active_question
 
-    async def add_points(self, user: User, score: int):
-        await self._app.store.game.add_points_to_user(
-            game_id=self.id,
-            user_id=user.id,
-            score=score,
-        )
+    def get_answer(self, title: str) -> AnswerDC | None:
+        return self._app.store.state.match_answer(game=self.state, text=title)
 
-    async def check_user_lost(self, user: User):
-        failures_count = await self.app.store.game.get_user_failures_count(
-            game_id=self.id,
-            user_id=user.id,
-        )
-        if failures_count == 3:
-            await self.app.store.game.make_user_lost(
-                game_id=self.id,
-                user_id=user.id,
-            )
-            return True
-        return False
-
-    async def get_next_question(self) -> QuestionDC:
-        await self._app.store.game.move_to_next_question(game_id=self.id)
-        question = self._app.store.game.get_active_question(game_id=self.id)
-        return question
-
-    async def end(self):
-        await self._app.store.game.end_game(peer_id=self.peer_id)
-
-    async def get_winner(self) -> UserDC:
-        winner = await self._app.store.game.get_winner_with_score(
-            game_id=self.id,
+    def add_fail(self, player: PlayerStateDC) -> bool:
+        """
+        return True if the player has lost the game
+        """
+        return self._app.store.state.add_fail(game=self.state, player=player)
+
+    def add_points(self, player: PlayerStateDC, answer: AnswerDC):
+        self._app.store.state.add_points(
+            game=self.state,
+            player=player,
+            answer=answer,
         )
-        return winner
+
+    def get_next_question(self) -> QuestionDC | None:
+        return self._app.store.state.move_to_next_question(game=self.state)
+
+    def end(self) -> PlayerStateDC | None:
+        """
+        return the winner, or None if every player has lost
+        """
+        return self._app.store.state.end_game(game=self.state)
@@ -0,0 +1,60 @@
+import re
+
+from app.game.dataclasses import AnswerDC
+
+ANSWER_VARIANTS_SEPARATOR = re.compile(r"[/|]")
+NOT_WORD_CHARACTERS = re.compile(r"[^\w]+")
+# common russian inflection endings grouped by length, longest first
+ENDINGS = (
+    (3, {"ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "иях"}),
+    (2, {
+        "ах", "ях", "ам", "ям", "ом", "ем", "ой", "ей", "ий", "ый", "ая",
+        "яя", "ое", "ее", "ые", "ие", "ов", "ев", "ью",
+    }),
+    (1, {"а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й"}),
+)
+MIN_STEM_LENGTH = 3
+
+
+def normalize(text: str) -> str:
+    text = text.lower().replace("ё", "е")
+    return " ".join(NOT_WORD_CHARACTERS.sub(" ", text).split())
+
+
+def stem(word: str) -> str:
+    for ending_length, endings in ENDINGS:
+        stem_length = len(word) - ending_length
+        if stem_length >= MIN_STEM_LENGTH and word[stem_length:] in endings:
+            return word[:stem_length]
+    return word
+
+
+def stem_phrase(normalized_text: str) -> str:
+    return " ".join(stem(word) for word in normalized_text.split(" "))
+
+
+class AnswerMatcher:
+    """
+    Hash index of the answers of one question. Every answer is stored
+    under its normalized form and its stemmed form, answer titles may
+    list synonyms separated by "/" or "|", e.g. "машина/автомобиль".
+    """
+    def __init__(self, answers: list[AnswerDC]):
+        self.exact: dict[str, AnswerDC] = {}
+        self.stemmed: dict[str, AnswerDC] = {}
+        for answer in answers:
+            for variant in ANSWER_VARIANTS_SEPARATOR.split(answer.title):
+                normalized = normalize(variant)
+                if not normalized:
+                    continue
+                self.exact.setdefault(normalized, answer)
+                self.stemmed.setdefault(stem_phrase(normalized), answer)
+
+    def match(self, text: str) -> AnswerDC | None:
+        normalized = normalize(text)
+        if not normalized:
+            return None
+        answer = self.exact.get(normalized)
+        if answer:
+            return answer
+        return self.stemmed.get(stem_phrase(normalized))
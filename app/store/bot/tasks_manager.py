@@ -1,68 +1,202 @@
+import time
 import typing
 import asyncio
+from typing import Coroutine
 
+from app.store.bot.constants import TEXT_COMMANDS
 from app.store.bot.update_handler import UpdateHandler
 from app.base.base_accessor import BaseAccessor
-from app.store.bot.updates import UpdateEvent, UpdateMessage, Update
+from app.store.bot.updates import (
+    UpdateEvent, UpdateMessage, Update, get_event_id, parse_updates
+)
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
 
 class UpdateTasksManager(BaseAccessor):
+    """
+    Dispatches updates through one serial queue per peer_id, so updates
+    of a chat are handled in order while different chats run in parallel.
+    """
     def __init__(self, app: "Application"):
         self.app = app
         self.update_handler = UpdateHandler(app)
-        self.tasks: list[asyncio.Task] = []
-        self.clear_task: asyncio.Task = None
+        self.queues: dict[int, asyncio.Queue] = {}
+        self.workers: dict[int, asyncio.Task] = {}
+        self.tasks: set[asyncio.Task] = set()
+        self.concurrency: asyncio.Semaphore | None = None
+        self.pending: asyncio.Semaphore | None = None
+        self.metrics_task: asyncio.Task = None
+        self.handled_updates = 0
+        self.discarded_updates = 0
+        self.redelivered_updates = 0
+        # sequence numbers of queued updates, in_flight holds
+        # the ones not handled yet
+        self.queued_updates = 0
+        self.in_flight: set[int] = set()
         self.is_running = False
         super().__init__(app)
 
     async def connect(self, app):
+        self.concurrency = asyncio.Semaphore(
+            app.config.bot.max_concurrent_updates
+        )
+        self.pending = asyncio.Semaphore(app.config.bot.max_pending_updates)
         self.is_running = True
         self.logger.info("start tasks manager")
-        self.clear_task = asyncio.create_task(self.clear_tasks())
-        self.clear_task.add_done_callback(self._log_task_exception)
+        self.metrics_task = asyncio.create_task(self.log_metrics())
+        self.metrics_task.add_done_callback(self._log_task_exception)
 
     async def disconnect(self, app):
         self.is_running = False
         self.logger.info("start shutting down tasks manager")
-        await self.clear_task
-        for task in self.tasks:
-            if task.done() or task.cancelled():
-                continue
-            await task
+        if self.metrics_task:
+            self.metrics_task.cancel()
+        await asyncio.gather(*self.workers.values(), *self.tasks)
 
-    async def clear_tasks(self):
+    async def log_metrics(self):
         while self.is_running:
             await asyncio.sleep(10)
-            self.tasks = [task for task in self.tasks if not (
-                task.done() or task.cancelled())]
+            metrics = self.get_metrics()
+            if metrics["queued_updates"]:
+                self.logger.info(metrics)
+
+    def queue_depths(self) -> dict[int, int]:
+        return {
+            peer_id: queue.qsize() for peer_id, queue in self.queues.items()
+        }
+
+    def get_metrics(self) -> dict:
+        depths = self.queue_depths().values()
+        return dict(
+            active_chats=len(self.queues),
+            queued_updates=sum(depths),
+            max_queue_depth=max(depths, default=0),
+            handled_updates=self.handled_updates,
+            discarded_updates=self.discarded_updates,
+            redelivered_updates=self.redelivered_updates,
+            background_tasks=len(self.tasks),
+        )
+
+    def handled_through(self) -> int:
+        """
+        return the number of queued updates all handled by now
+        """
+        return min(self.in_flight, default=self.queued_updates)
 
     def _log_task_exception(self, task: asyncio.Task):
         try:
             task.result()
         except asyncio.CancelledError:
             pass
-        # except Exception as e:
-        #     self.logger.warning(str(e))
+        except Exception as e:
+            self.logger.error("Exception", exc_info=e)
+
+    def run_in_background(self, coro: Coroutine):
+        """
+        run work that must not hold the chat queue, e.g. countdowns
+        """
+        task = asyncio.create_task(coro)
+        task.add_done_callback(self._log_task_exception)
+        task.add_done_callback(self.tasks.discard)
+        self.tasks.add(task)
+
+    async def handle_raw_updates(self, raw_updates: list[dict]) -> None:
+        if self.app.store.shards.is_receiver:
+            await self.app.store.shards.route(raw_updates=raw_updates)
+            return
+        events = self.app.store.state.events
+        new_updates = [
+            raw_update for raw_update in raw_updates
+            if not events.is_applied(event_id=get_event_id(raw_update))
+        ]
+        self.redelivered_updates += len(raw_updates) - len(new_updates)
+        relevant_updates = [
+            raw_update for raw_update in new_updates
+            if self.is_relevant(raw_update=raw_update)
+        ]
+        self.discarded_updates += len(new_updates) - len(relevant_updates)
+        await self.handle_updates(
+            parse_updates(app=self.app, raw_updates=relevant_updates)
+        )
+
+    def is_relevant(self, raw_update: dict) -> bool:
+        """
+        plain chat messages are dropped before parsing unless
+        the chat has an active game they may answer
+        """
+        message = raw_update.get("object", {}).get("message")
+        if message is None:
+            return True
+        return (
+            message.get("peer_id") in self.app.store.state.games
+            or message.get("text") in TEXT_COMMANDS
+        )
 
     async def handle_updates(self, updates: list[Update]) -> None:
         for update in updates:
-            if isinstance(update, UpdateMessage):
-                update_message = update
-                task = asyncio.create_task(
-                    self.update_handler.handle_message(
-                        upd_msg=update_message
-                    )
+            # waits here while too many updates are queued,
+            # which in turn holds back the poller
+            await self.pending.acquire()
+            queue = self.queues.get(update.peer_id)
+            if queue is None:
+                queue = asyncio.Queue()
+                self.queues[update.peer_id] = queue
+                worker = asyncio.create_task(
+                    self.process_queue(peer_id=update.peer_id, queue=queue)
                 )
-            elif isinstance(update, UpdateEvent):
-                update_event = update
-                task = asyncio.create_task(
-                    self.update_handler.handle_event(
-                        upd_event=update_event
+                worker.add_done_callback(self._log_task_exception)
+                self.workers[update.peer_id] = worker
+            sequence = self.queued_updates
+            self.queued_updates += 1
+            self.in_flight.add(sequence)
+            queue.put_nowait((sequence, update))
+
+    async def process_queue(self, peer_id: int, queue: asyncio.Queue):
+        tracing = self.app.store.tracing
+        try:
+            while not queue.empty():
+                sequence, update = queue.get_nowait()
+                trace = tracing.start_trace()
+                started_at = time.perf_counter()
+                try:
+                    async with self.concurrency:
+                        await self.handle_update(update=update)
+                except Exception as e:
+                    self.logger.error("Exception", exc_info=e)
+                finally:
+                    tracing.record(
+                        kind="update",
+                        name=type(update).__name__,
+                        started_at=started_at,
                     )
-                )
+                    tracing.end_trace(trace)
+                    self.in_flight.discard(sequence)
+                    self.handled_updates += 1
+                    self.pending.release()
+        finally:
+            self.queues.pop(peer_id, None)
+            self.workers.pop(peer_id, None)
 
-            task.add_done_callback(self._log_task_exception)
-            self.tasks.append(task)
+    async def handle_update(self, update: Update) -> None:
+        """
+        handlers run outside a transaction: each accessor call is its
+        own short unit of work, committed before game events refer to
+        its rows and never open while VK is awaited. so an update no
+        longer gets one transaction of its own: /create and joins look
+        the user up, a new user adds its upsert, /create the game
+        insert, answers to an active game touch no database at all.
+        nested accessor calls and the event log batches still share
+        one transaction each
+        """
+        events = self.app.store.state.events
+        with events.applying(event_id=update.event_id):
+            if isinstance(update, UpdateMessage):
+                # answers to one message go out together once handled
+                async with update.buffered_replies():
+                    await self.update_handler.handle_message(
+                        upd_msg=update,
+                    )
+            elif isinstance(update, UpdateEvent):
+                await self.update_handler.handle_event(upd_event=update)
@@ -0,0 +1,164 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+import typing
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from app.base.base_accessor import BaseAccessor
+from app.store.bot.constants import BotMessages
+from app.store.bot.message import Message
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+@dataclass(order=True)
+class Deadline:
+    when: float
+    seq: int
+    callback: Callable[[], Awaitable] = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+@dataclass
+class Countdown:
+    message: Message
+    ends_at: float
+    rendered_seconds: int
+
+
+class TimersManager(BaseAccessor):
+    """
+    Runs every countdown and deadline of the bot from a single loop.
+    Countdown edits are skipped while the outbound queue is congested,
+    the final state of a countdown is rendered exactly once.
+    """
+    def __init__(self, app: "Application", *args, **kwargs):
+        super().__init__(app, *args, **kwargs)
+        self.deadlines: list[Deadline] = []
+        self.countdowns: list[Countdown] = []
+        self.counter = itertools.count()
+        self.wakeup: asyncio.Event | None = None
+        self.loop_task: asyncio.Task | None = None
+        self.skipped_edits = 0
+
+    async def connect(self, app: "Application"):
+        self.wakeup = asyncio.Event()
+        self.loop_task = asyncio.create_task(self.run())
+        # games recovered in their join window need a new countdown
+        tasks_manager = self.app.store.tasks_manager
+        tasks_manager.run_in_background(
+            tasks_manager.update_handler.resume_games()
+        )
+
+    async def disconnect(self, app: "Application"):
+        if self.loop_task:
+            self.loop_task.cancel()
+
+    def call_at(
+        self,
+        when: float,
+        callback: Callable[[], Awaitable],
+    ) -> Deadline:
+        """
+        when is a time.monotonic() timestamp
+        """
+        deadline = Deadline(
+            when=when,
+            seq=next(self.counter),
+            callback=callback,
+        )
+        heapq.heappush(self.deadlines, deadline)
+        self.wakeup.set()
+        return deadline
+
+    def call_later(
+        self,
+        delay: float,
+        callback: Callable[[], Awaitable],
+    ) -> Deadline:
+        return self.call_at(time.monotonic() + delay, callback)
+
+    async def start_countdown(
+        self,
+        peer_id: int,
+        seconds: int,
+        on_finish: Callable[[], Awaitable],
+    ) -> Deadline:
+        message = Message(
+            app=self.app,
+            peer_id=peer_id,
+            text=BotMessages.back_timer.format(seconds=seconds),
+        )
+        await message.send()
+        countdown = Countdown(
+            message=message,
+            ends_at=time.monotonic() + seconds,
+            rendered_seconds=seconds,
+        )
+        self.countdowns.append(countdown)
+
+        async def finish():
+            self.countdowns.remove(countdown)
+            await message.edit(text=BotMessages.time_over)
+            await on_finish()
+
+        return self.call_at(countdown.ends_at, finish)
+
+    def _next_timeout(self) -> float | None:
+        timeouts = []
+        if self.deadlines:
+            timeouts.append(self.deadlines[0].when - time.monotonic())
+        if self.countdowns:
+            timeouts.append(1.0)
+        if not timeouts:
+            return None
+        return max(min(timeouts), 0)
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self.wakeup.wait(),
+                    timeout=self._next_timeout(),
+                )
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            self.tick()
+
+    def tick(self):
+        now = time.monotonic()
+        while self.deadlines and self.deadlines[0].when <= now:
+            deadline = heapq.heappop(self.deadlines)
+            if not deadline.cancelled:
+                self.app.store.tasks_manager.run_in_background(
+                    deadline.callback()
+                )
+
+        if self._is_congested():
+            self.skipped_edits += len(self.countdowns)
+            return
+        for countdown in self.countdowns:
+            seconds = math.ceil(countdown.ends_at - now)
+            if 0 < seconds < countdown.rendered_seconds:
+                countdown.rendered_seconds = seconds
+                self.app.store.tasks_manager.run_in_background(
+                    countdown.message.edit(
+                        text=BotMessages.back_timer.format(seconds=seconds),
+                    )
+                )
+
+    def _is_congested(self) -> bool:
+        # pending calls of the batcher never pile up, it flushes
+        # them every 25, the backlog is behind the rate limiter
+        return (
+            self.app.store.vk_api.backlog()
+            >= self.app.config.bot.timer_congestion_threshold
+        )
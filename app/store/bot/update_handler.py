@@ -1,14 +1,18 @@
 import typing
-from functools import wraps
+from functools import wraps, partial
 from logging import getLogger
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
+from app.game.dataclasses import GameStateDC
 from app.store.bot.updates import UpdateMessage, UpdateEvent, Update
 from app.store.bot.constants import (
-    BotTextCommands, BotMessages, BotEventCommands
+    BotTextCommands, BotMessages, BotEventCommands, JOIN_TIME_SECONDS,
+    TOP_SIZE, BREAK_LINE,
 )
 from app.store.bot.keyboards import join_keyboard
+from app.store.state.events import EventLogTimeout
+from app.store.tracing.accessor import traced
 
 
 def filter_game(needed: bool):
@@ -16,10 +20,8 @@ def filter_game(needed: bool):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             upd: Update = list(kwargs.values())[0]
-            game_exists = await upd.game.exists()
-            if game_exists:
-                await upd.game.init()
-            if game_exists is needed:
+            upd.game.init()
+            if upd.game.exists() is needed:
                 await func(*args, **kwargs)
         return wrapper
     return decorator
@@ -46,6 +48,8 @@ class UpdateHandler:
                 await self.get_info(upd_msg=upd_msg)
             case BotTextCommands.create_game:
                 await self.create_game(upd_msg=upd_msg)
+            case BotTextCommands.get_top:
+                await self.get_top(upd_msg=upd_msg)
             case _:
                 await self.handle_answer(upd_msg=upd_msg)
 
@@ -55,82 +59,139 @@ class UpdateHandler:
             case BotEventCommands.join:
                 await self.join_player(upd_event=upd_event)
 
+    @traced(kind="handler")
     async def get_info(self, upd_msg: UpdateMessage):
         await upd_msg.answer(text=BotMessages.info)
 
+    @traced(kind="handler")
+    async def get_top(self, upd_msg: UpdateMessage):
+        entries = await self.app.store.game.list_leaderboard(
+            limit=TOP_SIZE,
+            peer_id=upd_msg.peer_id,
+        )
+        if not entries:
+            await upd_msg.answer(text=BotMessages.top_empty)
+            return
+        lines = [BotMessages.top]
+        for place, entry in enumerate(entries, start=1):
+            lines.append(BotMessages.top_line.format(
+                place=place,
+                user=entry.user.display_name,
+                points=entry.points,
+                wins=entry.wins,
+                accuracy=round(entry.accuracy * 100),
+            ))
+        await upd_msg.answer(text=BREAK_LINE.join(lines))
+
+    @traced(kind="handler")
     @filter_game(needed=False)
     @init_user
     async def create_game(self, upd_msg: UpdateMessage):
-        await upd_msg.game.create()
-        await upd_msg.game.create_user(user=upd_msg.user)
+        try:
+            await upd_msg.game.create()
+        except EventLogTimeout as e:
+            self.logger.warning(f"previous game is not closed: {e}")
+            await upd_msg.answer(text=BotMessages.previous_game_saving)
+            return
+        if not upd_msg.game.exists():
+            await upd_msg.answer(text=BotMessages.no_questions)
+            return
+        upd_msg.game.create_user(user=upd_msg.user, is_creator=True)
 
         await upd_msg.answer(
             text=BotMessages.create,
             keyboard=join_keyboard(),
         )
-        await upd_msg.game.back_timer()
+        # the countdown message must follow the game announcement
+        await upd_msg.flush_replies()
+        await self.app.store.timers.start_countdown(
+            peer_id=upd_msg.peer_id,
+            seconds=JOIN_TIME_SECONDS,
+            on_finish=partial(self.start_game, game=upd_msg.game.state),
+        )
 
-        question = await upd_msg.game.get_active_question()
-        await upd_msg.answer(text=question.title)
+    @traced(kind="handler")
+    async def start_game(self, game: GameStateDC):
+        if not game.game.in_process:
+            return
+        await self.app.store.vk_api.send_message(
+            peer_id=game.game.peer_id,
+            text=game.active_question.title,
+            keyboard="",
+        )
 
+    async def resume_games(self):
+        """
+        restart the join countdown of the games recovered before
+        their first question was answered, the countdown running
+        before a restart is lost with the process
+        """
+        recovered, self.app.store.state.recovered = (
+            self.app.store.state.recovered, []
+        )
+        for game in recovered:
+            if not game.game.in_process or game.question_index:
+                continue
+            await self.app.store.timers.start_countdown(
+                peer_id=game.game.peer_id,
+                seconds=JOIN_TIME_SECONDS,
+                on_finish=partial(self.start_game, game=game),
+            )
+
+    @traced(kind="handler")
     @filter_game(needed=True)
     @init_user
     async def join_player(self, upd_event: UpdateEvent):
-        user_in_game = await upd_event.game.check_user_in_game(
-            user=upd_event.user,
-        )
-        if not user_in_game:
-            await upd_event.game.create_user(user=upd_event.user)
-            await upd_event.show_snackbar(text=BotMessages.already_join)
+        if not upd_event.game.check_user_in_game(user=upd_event.user):
+            upd_event.game.create_user(user=upd_event.user)
+            await upd_event.show_snackbar(text=BotMessages.user_join)
             return
 
         await upd_event.show_snackbar(text=BotMessages.already_join)
 
+    @traced(kind="handler")
     @filter_game(needed=True)
     async def handle_answer(self, upd_msg: UpdateMessage):
-        if not await upd_msg.user.get():
-            return
-        if not await upd_msg.game.check_user_in_game(user=upd_msg.user):
+        player = upd_msg.game.get_player(user=upd_msg.user)
+        # players out of attempts watch the rest of the game
+        if not player or player.is_lost:
             return
 
-        answer = await upd_msg.game.get_answer(title=upd_msg.text)
+        answer = upd_msg.game.get_answer(title=upd_msg.text)
         if not answer:
-            await upd_msg.game.add_fail(user=upd_msg.user)
+            user_lost = upd_msg.game.add_fail(player=player)
             await upd_msg.answer(
                 text=BotMessages.user_failed.format(
-                    user=upd_msg.user.full_name,
+                    user=player.user.display_name,
                 ),
             )
-
-            user_lost = await upd_msg.game.check_user_lost(user=upd_msg.user)
             if user_lost:
                 await upd_msg.answer(
                     text=BotMessages.user_lost.format(
-                        user=upd_msg.user.full_name
+                        user=player.user.display_name
                     ),
                 )
         else:
-            await upd_msg.game.add_points(
-                user=upd_msg.user,
-                score=answer.score,
-            )
+            upd_msg.game.add_points(player=player, answer=answer)
             await upd_msg.answer(
                 text=BotMessages.user_right.format(
-                    user=upd_msg.user.full_name,
+                    user=player.user.display_name,
                     score=answer.score,
                 )
             )
 
-        next_question = await upd_msg.game.get_next_question()
+        next_question = upd_msg.game.get_next_question()
         if next_question:
             await upd_msg.answer(text=next_question.title)
             return
 
-        await upd_msg.game.end()
-        winner = await upd_msg.game.get_winner()
+        winner = upd_msg.game.end()
+        if not winner:
+            await upd_msg.answer(text=BotMessages.end_game_without_winner)
+            return
         await upd_msg.answer(
-            text=BotMessages.end_game(
-                user=winner.full_name,
-                score=winner.score,
+            text=BotMessages.end_game.format(
+                user=winner.user.display_name,
+                score=winner.points,
             )
         )
@@ -1,5 +1,8 @@
 import typing
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
+from app.store.bot.constants import BREAK_LINE, MAX_MESSAGE_LENGTH
 from app.store.bot.game import Game
 from app.store.bot.user import User
 from app.store.bot.keyboards import Keyboard
@@ -9,6 +12,13 @@ if typing.TYPE_CHECKING:
 
 
 class Update:
+    """
+    Light record of one long poll update. The Game and User helpers are
+    created on first access, so updates that never reach a handler
+    allocate nothing but the record itself.
+    """
+    __slots__ = ("app", "peer_id", "user_id", "event_id", "_game", "_user")
+
     def __init__(
         self,
         app: "Application",
@@ -20,17 +30,31 @@ class Update:
         self.peer_id = peer_id
         self.user_id = user_id
         self.event_id = event_id
-        self.game = Game(
-            app=app,
-            peer_id=peer_id,
-        )
-        self.user = User(
-            app=app,
-            vk_id=user_id,
-        )
+        self._game: Game | None = None
+        self._user: User | None = None
+
+    @property
+    def game(self) -> Game:
+        if self._game is None:
+            self._game = Game(
+                app=self.app,
+                peer_id=self.peer_id,
+            )
+        return self._game
+
+    @property
+    def user(self) -> User:
+        if self._user is None:
+            self._user = User(
+                app=self.app,
+                vk_id=self.user_id,
+            )
+        return self._user
 
 
 class UpdateMessage(Update):
+    __slots__ = ("text", "cmd", "replies")
+
     def __init__(
         self,
         app: "Application",
@@ -48,16 +72,50 @@ class UpdateMessage(Update):
         )
         self.text = text
         self.cmd = cmd
+        self.replies: list[tuple[str, Keyboard | str]] | None = None
 
     async def answer(self, text: str, keyboard: Keyboard | str = ""):
+        if self.replies is not None:
+            self.replies.append((text, keyboard))
+            return
         await self.app.store.vk_api.send_message(
             peer_id=self.peer_id,
             text=text,
             keyboard=keyboard,
         )
 
+    @asynccontextmanager
+    async def buffered_replies(self) -> AsyncIterator[None]:
+        """
+        hold answers given inside and send them merged on exit,
+        answers given later, e.g. by timers, are sent right away
+        """
+        self.replies = []
+        try:
+            yield
+        finally:
+            await self.flush_replies()
+            self.replies = None
+
+    async def flush_replies(self):
+        """
+        send the answers held so far, needed before a message
+        that is sent past the buffer must follow them
+        """
+        if not self.replies:
+            return
+        replies, self.replies = self.replies, []
+        for text, keyboard in merge_replies(replies=replies):
+            await self.app.store.vk_api.send_message(
+                peer_id=self.peer_id,
+                text=text,
+                keyboard=keyboard,
+            )
+
 
 class UpdateEvent(Update):
+    __slots__ = ("payload",)
+
     def __init__(
         self,
         app: "Application",
@@ -81,3 +139,80 @@ class UpdateEvent(Update):
             peer_id=self.peer_id,
             text=text,
         )
+
+
+def merge_replies(
+    replies: list[tuple[str, Keyboard | str]],
+) -> list[tuple[str, Keyboard | str]]:
+    """
+    join consecutive answers line by line into as few messages
+    as fit, a message carries at most one keyboard
+    """
+    merged = []
+    for text, keyboard in replies:
+        if merged:
+            last_text, last_keyboard = merged[-1]
+            length = len(last_text) + len(BREAK_LINE) + len(text)
+            if (
+                (keyboard == "" or last_keyboard == "")
+                and length <= MAX_MESSAGE_LENGTH
+            ):
+                merged[-1] = (
+                    last_text + BREAK_LINE + text,
+                    last_keyboard if keyboard == "" else keyboard,
+                )
+                continue
+        merged.append((text, keyboard))
+    return merged
+
+
+def get_peer_id(raw_update: dict) -> int | None:
+    upd_obj = raw_update.get("object", {})
+    if upd_obj.get("message"):
+        return upd_obj["message"].get("peer_id")
+    return upd_obj.get("peer_id")
+
+
+def get_event_id(raw_update: dict) -> str | None:
+    """
+    the event_id parse_update gives the update
+    """
+    upd_obj = raw_update.get("object", {})
+    if upd_obj.get("message"):
+        return raw_update.get("event_id")
+    return upd_obj.get("event_id")
+
+
+def parse_update(app: "Application", raw_update: dict) -> Update | None:
+    upd_obj = raw_update["object"]
+    if upd_obj.get("message"):
+        message = upd_obj["message"]
+        return UpdateMessage(
+            app=app,
+            user_id=message["from_id"],
+            text=message["text"],
+            peer_id=message["peer_id"],
+            event_id=raw_update["event_id"],
+            cmd=message["conversation_message_id"],
+        )
+    if upd_obj.get("event_id"):
+        return UpdateEvent(
+            app=app,
+            user_id=upd_obj["user_id"],
+            peer_id=upd_obj["peer_id"],
+            event_id=upd_obj["event_id"],
+            payload=upd_obj["payload"],
+        )
+    return None
+
+
+def parse_updates(
+    app: "Application",
+    raw_updates: list[dict],
+) -> list[Update]:
+    updates = []
+    for raw_update in raw_updates:
+        update = parse_update(app=app, raw_update=raw_update)
+        if update:
+            updates.append(update)
+    return updates
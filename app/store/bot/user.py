@@ -1,10 +1,14 @@
 import typing
 
+from app.game.dataclasses import UserDC
+
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
 
 class User:
+    __slots__ = ("_app", "vk_id", "id", "first_name", "last_name", "score")
+
     def __init__(self, app: "Application", vk_id: int):
         self._app = app
         self.vk_id = vk_id
@@ -17,12 +21,27 @@ class User:
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
 
+    def to_dataclass(self) -> UserDC:
+        return UserDC(
+            id=self.id,
+            vk_id=self.vk_id,
+            first_name=self.first_name,
+            last_name=self.last_name,
+        )
+
     async def init(self):
-        user_data = await self._app.store.game.get_user(vk_id=self.vk_id)
-        if not user_data:
-            user_data = await self._app.store.game.create_user(
-                vk_id=self.vk_id,
-            )
+        if await self.get():
+            return
+        # only new users are looked up on VK, no transaction
+        # is open while waiting on it
+        profile = await self._app.store.vk_api.get_user_info(
+            vk_id=self.vk_id,
+        )
+        user_data = await self._app.store.game.create_user(
+            vk_id=self.vk_id,
+            first_name=profile.first_name if profile else None,
+            last_name=profile.last_name if profile else None,
+        )
         self.id = user_data.id
         self.first_name = user_data.first_name
         self.last_name = user_data.last_name
@@ -8,4 +8,6 @@ from app.game.models import (
     AnswerModel,
     RoadmapModel,
     GameAnswersModel,
+    UserLeaderboardModel,
+    ChatLeaderboardModel,
 ) 
@@ -1,4 +1,6 @@
-from typing import TYPE_CHECKING, Any
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator
 from sqlalchemy.ext.asyncio import (
     AsyncEngine, AsyncSession,
     create_async_engine, async_sessionmaker
@@ -6,11 +8,17 @@ from sqlalchemy.ext.asyncio import (
 from sqlalchemy.orm import DeclarativeBase
 
 from app.store.database import Base
+from app.store.database.pool import InstrumentedPool
 
 if TYPE_CHECKING:
     from app.web.app import Application
 
 
+current_session: ContextVar[AsyncSession | None] = ContextVar(
+    "current_session", default=None
+)
+
+
 class Database:
     def __init__(self, app: "Application"):
         self.app = app
@@ -20,12 +28,23 @@ class Database:
 
     async def connect(self, *args: Any, **kwargs: Any) -> None:
         self._db = Base
+        config = self.app.config.database
         self._engine = create_async_engine(
-            "postgresql+asyncpg://{}:{}@{}/{}".format(
-                self.app.config.database.user,
-                self.app.config.database.password,
-                self.app.config.database.host,
-                self.app.config.database.database,
+            "postgresql+asyncpg://{}:{}@{}:{}/{}".format(
+                config.user,
+                config.password,
+                config.host,
+                config.port,
+                config.database,
+            ),
+            poolclass=InstrumentedPool,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_timeout=config.pool_timeout,
+            pool_pre_ping=config.pool_pre_ping,
+            connect_args=dict(
+                statement_cache_size=config.statement_cache_size,
+                command_timeout=config.command_timeout,
             ),
         )
         self.session = async_sessionmaker(
@@ -36,3 +55,25 @@ class Database:
     async def disconnect(self, *args: Any, **kwargs: Any) -> None:
         if self._engine:
             await self._engine.dispose()
+
+    def get_pool_stats(self) -> dict:
+        return self._engine.pool.get_stats()
+
+    @asynccontextmanager
+    async def unit_of_work(self) -> AsyncIterator[AsyncSession]:
+        """
+        one transaction shared by every accessor call made inside,
+        a connection is checked out on the first query only
+        """
+        session = current_session.get()
+        # tasks spawned inside a unit of work inherit its context
+        # and may outlive it
+        if session is not None and session.in_transaction():
+            yield session
+            return
+        async with self.session.begin() as session:
+            token = current_session.set(session)
+            try:
+                yield session
+            finally:
+                current_session.reset(token)
@@ -1,43 +1,56 @@
 import datetime
-from sqlalchemy import select, and_, desc
+from sqlalchemy import (
+    select, update, and_, desc, literal, case, values, column,
+    tuple_, Integer, Boolean,
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import selectinload
 from sqlalchemy.sql.expression import func
 from app.base.base_accessor import BaseAccessor
 from app.game.models import (
     GameModel, UserModel, StatisticsModel,
     QuestionModel, RoadmapModel, AnswerModel,
-    GameAnswersModel,
+    GameAnswersModel, UserLeaderboardModel, ChatLeaderboardModel,
 )
 from app.game.dataclasses import (
     UserDC, GameDC, QuestionDC,
-    AnswerDC, UserStatisticsDC, RoadmapDC
+    AnswerDC, UserStatisticsDC, RoadmapDC, LeaderboardEntryDC
 )
 from app.store.utils import decorate_all_methods, add_db_session_to_accessor
+from app.store.tracing.accessor import traced
 
 
+@decorate_all_methods(traced(kind="accessor"))
 @decorate_all_methods(add_db_session_to_accessor)
 class GameAccessor(BaseAccessor):
     async def create_user(
         self,
         vk_id: int,
+        first_name: str | None = None,
+        last_name: str | None = None,
         **kwargs,
     ) -> UserDC:
-        session = kwargs.get("session")
-        user_data = await self.app.store.vk_api.get_user_info(
+        # the same user may join games in two chats at once
+        query = insert(UserModel).values(
             vk_id=vk_id,
+            first_name=first_name,
+            last_name=last_name,
         )
-        if user_data:
-            user_model = UserModel(
-                vk_id=vk_id,
-                first_name=user_data.first_name,
-                last_name=user_data.last_name,
-            )
-        else:
-            user_model = UserModel(
-                vk_id=vk_id,
-            )
-        session.add(user_model)
-        await session.commit()
+        query = query.on_conflict_do_update(
+            index_elements=[UserModel.vk_id],
+            set_=dict(
+                first_name=func.coalesce(
+                    query.excluded.first_name, UserModel.first_name
+                ),
+                last_name=func.coalesce(
+                    query.excluded.last_name, UserModel.last_name
+                ),
+            ),
+        ).returning(UserModel)
+        session = kwargs.get("session")
+        result = await session.execute(query)
+        user_model = result.scalar()
+        await session.flush()
         return user_model.to_dataclass()
 
     async def get_user(
@@ -55,70 +68,6 @@ class GameAccessor(BaseAccessor):
             return user_model.to_dataclass()
         return None
 
-    async def get_user_statistics(
-        self,
-        game_id: int,
-        user_id: int,
-        **kwargs,
-    ) -> UserStatisticsDC | None:
-        query = select(StatisticsModel).where(
-            and_(
-                StatisticsModel.game_id == game_id,
-                StatisticsModel.user_id == user_id
-            )
-        )
-        session = kwargs.get("session")
-        result = await session.execute(query)
-        user_statistics_model = result.scalar()
-        if user_statistics_model:
-            return user_statistics_model.to_dataclass()
-        return None
-
-    async def get_winner_with_score(
-        self,
-        game_id: int,
-        **kwargs,
-    ) -> UserDC:
-        query = select(
-            UserModel
-        ).where(
-            StatisticsModel.game_id == game_id,
-            StatisticsModel.is_lost == False  # noqa
-        ).join(
-            UserModel, StatisticsModel.user_id == UserModel.id
-        ).add_columns(
-            func.max(StatisticsModel.points)
-        ).group_by(
-            UserModel.id
-        ).order_by(desc(func.max(StatisticsModel.points)))
-        session = kwargs.get("session")
-        result = await session.execute(query)
-        user_model, score = result.first()
-        user_statistics = await self.get_user_statistics(
-            game_id=game_id,
-            user_id=user_model.id
-        )
-        user_statistics.is_winner = True
-        await session.merge(
-            StatisticsModel(
-                id=user_statistics.id,
-                game_id=user_statistics.game_id,
-                user_id=user_statistics.user_id,
-                failures=user_statistics.failures,
-                is_creator=user_statistics.is_creator,
-                is_lost=user_statistics.is_lost,
-                is_winner=user_statistics.is_winner
-            )
-        )
-        await session.commit()
-        return UserDC(
-            id=user_model.id,
-            vk_id=user_model.vk_id,
-            score=score,
-            first_name=user_model.first_name,
-            last_name=user_model.last_name,
-        )
-
     async def get_users_count_in_game(
         self,
         game_id: int,
@@ -156,29 +105,20 @@ class GameAccessor(BaseAccessor):
     async def create_game(
         self,
         peer_id: int,
+        question_ids: list[int],
         **kwargs,
     ) -> GameDC:
         session = kwargs.get("session")
         game_model = GameModel(peer_id=peer_id)
         session.add(game_model)
+        await session.flush()
 
-        three_random_questions_query = select(
-            QuestionModel
-        ).order_by(func.random()).limit(5)
-        result = await session.execute(three_random_questions_query)
-        questions = result.scalars()
-        roadmaps = []
-        for question in questions:
-            roadmaps.append(RoadmapModel(
-                game_id=game_model.id,
-                question_id=question.id,
-                status=0,
-            ))
-
-        roadmaps[0].status = 1
-
-        session.add_all(roadmaps)
-        await session.commit()
+        # roadmaps keep the question order, current_index walks it
+        session.add_all([
+            RoadmapModel(game_id=game_model.id, question_id=question_id)
+            for question_id in question_ids
+        ])
+        await session.flush()
 
         return game_model.to_dataclass()
 
@@ -200,160 +140,215 @@ class GameAccessor(BaseAccessor):
             return game_model.to_dataclass()
         return None
 
-    async def get_answer(
+    async def add_players(
         self,
-        title: str,
-        question_id: int,
+        rows: list[dict],
         **kwargs,
-    ) -> AnswerDC | None:
-        query = select(AnswerModel).where(
-            and_(
-                AnswerModel.title == title,
-                AnswerModel.question_id == question_id
-            )
+    ) -> None:
+        """
+        insert statistics rows given as dicts of game_id,
+        user_id and is_creator, skipping players already added
+        """
+        query = insert(StatisticsModel).values(rows).on_conflict_do_nothing(
+            index_elements=[StatisticsModel.game_id, StatisticsModel.user_id]
         )
         session = kwargs.get("session")
-        result = await session.execute(query)
-        answer_model = result.scalar()
-        if answer_model:
-            return answer_model.to_dataclass()
-        return None
+        await session.execute(query)
 
-    async def create_game_answer(
+    async def update_players(
         self,
-        game_id: int,
-        answer_id: int,
-        user_id: int,
+        rows: list[dict],
         **kwargs,
     ) -> None:
-        session = kwargs.get("session")
-        session.add(
-            GameAnswersModel(
-                game_id=game_id,
-                answer_id=answer_id,
-                user_id=user_id
+        """
+        set points, failures and is_lost of the players given
+        as dicts keyed by game_id and user_id
+        """
+        changes = values(
+            column("game_id", Integer),
+            column("user_id", Integer),
+            column("points", Integer),
+            column("failures", Integer),
+            column("is_lost", Boolean),
+            name="changes",
+        ).data([
+            (
+                row["game_id"],
+                row["user_id"],
+                row["points"],
+                row["failures"],
+                row["is_lost"],
             )
-        )
-        await session.commit()
-        return None
-
-    async def create_user_statistics(
-        self,
-        user_id: int,
-        game_id: int,
-        is_creator: bool = False,
-        **kwargs,
-    ) -> None:
-        statistics_model = StatisticsModel(
-            user_id=user_id,
-            game_id=game_id,
-            is_creator=is_creator
+            for row in rows
+        ])
+        query = update(StatisticsModel).where(
+            and_(
+                StatisticsModel.game_id == changes.c.game_id,
+                StatisticsModel.user_id == changes.c.user_id,
+            )
+        ).values(
+            points=changes.c.points,
+            failures=changes.c.failures,
+            is_lost=changes.c.is_lost,
         )
         session = kwargs.get("session")
-        session.add(statistics_model)
-        await session.commit()
+        await session.execute(query)
 
-    async def add_points_to_user(
+    async def add_game_answers(
         self,
-        game_id: int,
-        user_id: int,
-        score: int,
+        rows: list[dict],
         **kwargs,
     ) -> None:
-        query = select(StatisticsModel).where(
-            and_(
-                StatisticsModel.user_id == user_id,
-                StatisticsModel.game_id == game_id,
-            )
+        """
+        insert game_answers rows given as dicts of game_id, user_id
+        and answer_id, skipping answers already saved, as a journal
+        replay may give them again
+        """
+        query = insert(GameAnswersModel).values(rows).on_conflict_do_nothing(
+            index_elements=[
+                GameAnswersModel.game_id, GameAnswersModel.answer_id
+            ]
         )
         session = kwargs.get("session")
-        result = await session.execute(query)
-        statistics_model = result.scalar()
-        statistics_model.points += score
-        await session.merge(statistics_model)
-        await session.commit()
+        await session.execute(query)
 
-    async def add_fail_to_user(
+    async def update_progress(
         self,
-        game_id: int,
-        user_id: int,
+        rows: list[dict],
         **kwargs,
     ) -> None:
-        query = select(StatisticsModel).where(
-            and_(
-                StatisticsModel.user_id == user_id,
-                StatisticsModel.game_id == game_id,
-            )
+        """
+        set current_index of the games given as dicts of game_id
+        and current_index
+        """
+        progress = values(
+            column("game_id", Integer),
+            column("current_index", Integer),
+            name="progress",
+        ).data([(row["game_id"], row["current_index"]) for row in rows])
+        query = update(GameModel).where(
+            GameModel.id == progress.c.game_id
+        ).values(
+            current_index=progress.c.current_index,
         )
         session = kwargs.get("session")
-        result = await session.execute(query)
-        statistics_model = result.scalar()
-        statistics_model.failures += 1
-        await session.merge(statistics_model)
-        await session.commit()
+        await session.execute(query)
 
-    async def make_user_lost(
+    async def finish_game(
         self,
         game_id: int,
-        user_id: int,
+        podium_size: int = 3,
         **kwargs,
-    ) -> None:
-        query = select(StatisticsModel).where(
+    ) -> list[UserDC]:
+        """
+        close the game, rank the players still in it, mark the first
+        one as the winner and add the results to the leaderboards
+        in one statement. return the podium in order of places with
+        points as score. ties go to fewer failures, then to the player
+        who joined first. a game already closed is not counted again
+        """
+        game_end = update(GameModel).where(
             and_(
-                StatisticsModel.user_id == user_id,
-                StatisticsModel.game_id == game_id,
+                GameModel.id == game_id,
+                GameModel.in_process == True  # noqa
             )
-        )
-        session = kwargs.get("session")
-        result = await session.execute(query)
-        statistics_model = result.scalar()
-        statistics_model.is_lost = True
-        await session.merge(statistics_model)
-        await session.commit()
+        ).values(
+            ended_at=datetime.datetime.now(),
+            in_process=False,
+        ).returning(GameModel.id, GameModel.peer_id).cte("game_end")
+
+        place = func.row_number().over(
+            order_by=(
+                desc(StatisticsModel.points),
+                StatisticsModel.failures,
+                StatisticsModel.id,
+            )
+        ).label("place")
+        ranking = select(
+            StatisticsModel.id,
+            StatisticsModel.user_id,
+            StatisticsModel.points,
+            place,
+        ).where(
+            StatisticsModel.game_id == game_id,
+            StatisticsModel.is_lost == False  # noqa
+        ).cte("ranking")
 
-    async def get_user_failures_count(
-        self,
-        game_id: int,
-        user_id: int,
-        **kwargs,
-    ) -> int:
-        query = select(StatisticsModel).where(
+        winner_update = update(StatisticsModel).where(
             and_(
-                StatisticsModel.user_id == user_id,
-                StatisticsModel.game_id == game_id,
+                StatisticsModel.id == ranking.c.id,
+                ranking.c.place == 1,
             )
+        ).values(
+            is_winner=True,
+        ).returning(StatisticsModel.id).cte("winner_update")
+
+        right_answers = select(
+            GameAnswersModel.user_id,
+            func.count(GameAnswersModel.id).label("right_answers"),
+        ).where(
+            GameAnswersModel.game_id == game_id
+        ).group_by(
+            GameAnswersModel.user_id
+        ).cte("right_answers")
+        results = select(
+            game_end.c.peer_id,
+            StatisticsModel.user_id,
+            literal(1).label("games_played"),
+            case((ranking.c.place == 1, 1), else_=0).label("wins"),
+            StatisticsModel.points,
+            func.coalesce(right_answers.c.right_answers, 0).label(
+                "right_answers"
+            ),
+            StatisticsModel.failures,
+        ).join(
+            game_end, game_end.c.id == StatisticsModel.game_id
+        ).outerjoin(
+            ranking, ranking.c.id == StatisticsModel.id
+        ).outerjoin(
+            right_answers, right_answers.c.user_id == StatisticsModel.user_id
+        ).cte("results")
+
+        query = select(
+            UserModel, ranking.c.points
+        ).join(
+            ranking, ranking.c.user_id == UserModel.id
+        ).where(
+            ranking.c.place <= podium_size
+        ).order_by(
+            ranking.c.place
+        ).add_cte(
+            game_end,
+            winner_update,
+            leaderboard_upsert(
+                model=ChatLeaderboardModel,
+                results=results,
+                keys=["peer_id", "user_id"],
+            ).cte("chat_leaderboard_upsert"),
+            leaderboard_upsert(
+                model=UserLeaderboardModel,
+                results=results,
+                keys=["user_id"],
+            ).cte("user_leaderboard_upsert"),
         )
         session = kwargs.get("session")
         result = await session.execute(query)
-        statistics_model = result.scalar()
-        return statistics_model.failures
-
-    async def end_game(
-        self,
-        peer_id: int,
-        **kwargs,
-    ) -> None:
-        session = kwargs.get("session")
-        game = await self.get_game_by_peer_id(
-            peer_id=peer_id
-        )
-        game.ended_at = datetime.datetime.now()
-        await session.merge(
-            GameModel(
-                id=game.id,
-                started_at=game.started_at,
-                ended_at=game.ended_at,
-                peer_id=game.peer_id,
-                in_process=False
+        return [
+            UserDC(
+                id=user_model.id,
+                vk_id=user_model.vk_id,
+                score=points,
+                first_name=user_model.first_name,
+                last_name=user_model.last_name,
             )
-        )
-        await session.commit()
+            for user_model, points in result.all()
+        ]
 
-    async def get_active_question(
+    async def list_game_questions(
         self,
         game_id: int,
         **kwargs,
-    ) -> QuestionDC | None:
+    ) -> list[QuestionDC]:
         query = select(
             QuestionModel
         ).options(
@@ -361,29 +356,6 @@ class GameAccessor(BaseAccessor):
         ).join(
             RoadmapModel,
             QuestionModel.id == RoadmapModel.question_id
-        ).where(and_(
-            RoadmapModel.status == 1,
-            RoadmapModel.game_id == game_id
-        ))
-        session = kwargs.get("session")
-        result = await session.execute(query)
-        question_model = result.scalar()
-        answers = []
-        if question_model:
-            for answer_model in question_model.answers:
-                answers.append(
-                    answer_model.to_dataclass()
-                )
-            return question_model.to_dataclass()
-        return None
-
-    async def move_to_next_question(
-        self,
-        game_id: int,
-        **kwargs,
-    ) -> bool:
-        query = select(
-            RoadmapModel
         ).where(
             RoadmapModel.game_id == game_id
         ).order_by(
@@ -391,21 +363,10 @@ class GameAccessor(BaseAccessor):
         )
         session = kwargs.get("session")
         result = await session.execute(query)
-        roadmap_models = result.scalars().all()
-        for index in range(len(roadmap_models)):
-            roadmap = roadmap_models[index]
-            if roadmap.status == 1:
-                roadmap.status = 0
-                try:
-                    next_roadmap = roadmap_models[index+1]
-                    next_roadmap.status = 1
-                except IndexError:
-                    return False
-
-                await session.merge(roadmap)
-                await session.merge(next_roadmap)
-                await session.commit()
-                return True
+        return [
+            question_model.to_dataclass()
+            for question_model in result.scalars()
+        ]
 
     async def get_question_by_title(
         self,
@@ -475,7 +436,7 @@ class GameAccessor(BaseAccessor):
             answers_models.append(answer_model)
         question_model.answers = answers_models
         session.add(question_model)
-        await session.commit()
+        await session.flush()
 
         response_answers = []
         for answer_model in question_model.answers:
@@ -512,7 +473,7 @@ class GameAccessor(BaseAccessor):
                 await session.merge(answer_model)
             question_model.title = title
             question_model = await session.merge(question_model)
-            await session.commit()
+            await session.flush()
             return question_model.to_dataclass()
 
     async def list_questions(
@@ -560,6 +521,7 @@ class GameAccessor(BaseAccessor):
         page: int | None,
         offset: int = 5,
         peer_id: int | None = None,
+        in_process: bool | None = None,
         **kwargs,
     ) -> list[GameDC]:
         query = select(
@@ -569,6 +531,10 @@ class GameAccessor(BaseAccessor):
             query = query.where(
                 GameModel.peer_id == peer_id
             )
+        if in_process is not None:
+            query = query.where(
+                GameModel.in_process == in_process
+            )
         if page:
             query = query.limit(offset).offset(offset * (page - 1))
         session = kwargs.get("session")
@@ -616,24 +582,75 @@ class GameAccessor(BaseAccessor):
         game_id: int | None = None,
         **kwargs,
     ) -> list[RoadmapDC]:
-        query = select(
-            RoadmapModel
-        )
+        positions = roadmap_positions()
         if game_id:
-            query = query.where(
+            positions = positions.where(
                 RoadmapModel.game_id == game_id
             )
+        positions = positions.subquery()
+        query = select(
+            positions.c.id,
+            positions.c.game_id,
+            positions.c.question_id,
+            case(
+                (positions.c.position == GameModel.current_index, 1),
+                else_=0,
+            ).label("status"),
+        ).join(
+            GameModel,
+            GameModel.id == positions.c.game_id
+        ).order_by(
+            positions.c.id
+        )
         if page:
             query = query.limit(offset).offset(offset * (page - 1))
         session = kwargs.get("session")
         result = await session.execute(query)
-        roadmap_models = result.scalars()
-        roadmaps = []
-        for roadmap_model in roadmap_models:
-            roadmaps.append(
-                roadmap_model.to_dataclass()
+        return [
+            RoadmapDC(
+                id=row.id,
+                game_id=row.game_id,
+                question_id=row.question_id,
+                status=row.status,
             )
-        return roadmaps
+            for row in result
+        ]
+
+    async def list_leaderboard(
+        self,
+        limit: int = 10,
+        peer_id: int | None = None,
+        after: tuple[int, int] | None = None,
+        **kwargs,
+    ) -> list[LeaderboardEntryDC]:
+        """
+        return users by points, of one chat if peer_id is given.
+        pages are read with after, the points and user id of the last
+        entry of the previous page, so a page costs its size only
+        """
+        model = UserLeaderboardModel
+        if peer_id is not None:
+            model = ChatLeaderboardModel
+        query = select(
+            model, UserModel
+        ).join(
+            UserModel, UserModel.id == model.user_id
+        )
+        if peer_id is not None:
+            query = query.where(model.peer_id == peer_id)
+        if after is not None:
+            query = query.where(
+                tuple_(model.points, model.user_id) < tuple_(*after)
+            )
+        query = query.order_by(
+            desc(model.points), desc(model.user_id)
+        ).limit(limit)
+        session = kwargs.get("session")
+        result = await session.execute(query)
+        return [
+            leaderboard_model.to_dataclass(user=user_model.to_dataclass())
+            for leaderboard_model, user_model in result.all()
+        ]
 
     async def list_user_statistics(
         self,
@@ -662,6 +679,8 @@ class GameAccessor(BaseAccessor):
                 query = query.where(
                     StatisticsModel.user_id == user_id
                 )
+        # in join order, restored games rank ties by it
+        query = query.order_by(StatisticsModel.id)
         if page:
             query = query.limit(offset).offset(offset * (page - 1))
         session = kwargs.get("session")
@@ -673,3 +692,40 @@ class GameAccessor(BaseAccessor):
                 user_statistics_model.to_dataclass()
             )
         return user_statistics
+
+
+def roadmap_positions():
+    """
+    roadmaps with the 0-based position of their question in the game
+    """
+    return select(
+        RoadmapModel.id,
+        RoadmapModel.game_id,
+        RoadmapModel.question_id,
+        (
+            func.row_number().over(
+                partition_by=RoadmapModel.game_id,
+                order_by=RoadmapModel.id,
+            ) - 1
+        ).label("position"),
+    )
+
+
+def leaderboard_upsert(model, results, keys: list[str]):
+    """
+    add the results of a game to the totals of a leaderboard
+    """
+    totals = [
+        "games_played", "wins", "points", "right_answers", "failures"
+    ]
+    query = insert(model).from_select(
+        keys + totals,
+        select(*(results.c[name] for name in keys + totals)),
+    )
+    return query.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            total: getattr(model, total) + query.excluded[total]
+            for total in totals
+        },
+    )
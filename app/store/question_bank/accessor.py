@@ -0,0 +1,92 @@
+import random
+import typing
+from array import array
+from collections import deque
+
+from app.base.base_accessor import BaseAccessor
+from app.game.dataclasses import QuestionDC
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+MAX_SAMPLE_ATTEMPTS_FACTOR = 10
+
+
+class QuestionBankAccessor(BaseAccessor):
+    """
+    In-memory copy of the questions table. Question ids are kept
+    in a compact array to sample games without querying the database,
+    skipping questions recently played in the same chat.
+    """
+    def __init__(self, app: "Application", *args, **kwargs):
+        super().__init__(app, *args, **kwargs)
+        self.ids = array("q")
+        self.questions: dict[int, QuestionDC] = {}
+        self.recent: dict[int, deque[int]] = {}
+
+    async def connect(self, app: "Application"):
+        questions = await self.app.store.game.list_questions(page=None)
+        for question in questions:
+            self.put(question=question)
+        self.logger.info(f"loaded {len(self.ids)} questions")
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def get(self, question_id: int) -> QuestionDC | None:
+        return self.questions.get(question_id)
+
+    def put(self, question: QuestionDC):
+        if question.id not in self.questions:
+            self.ids.append(question.id)
+        self.questions[question.id] = question
+
+    async def reload_question(self, question_id: int):
+        question = await self.app.store.game.get_question_by_id(
+            id=question_id,
+        )
+        if question:
+            self.put(question=question)
+
+    def sample(self, peer_id: int, count: int) -> list[QuestionDC]:
+        """
+        return up to count distinct questions, avoiding the ones
+        recently played in the chat while the bank is large enough
+        """
+        if self.size <= count:
+            question_ids = list(self.ids)
+            random.shuffle(question_ids)
+        else:
+            question_ids = self._sample_ids(
+                count=count,
+                excluded=set(self.recent.get(peer_id, ())),
+            )
+        self._remember(peer_id=peer_id, question_ids=question_ids)
+        return [self.questions[question_id] for question_id in question_ids]
+
+    def _sample_ids(self, count: int, excluded: set[int]) -> list[int]:
+        chosen: list[int] = []
+        chosen_set: set[int] = set()
+        if self.size - len(excluded) < count:
+            excluded = set()
+        attempts = count * MAX_SAMPLE_ATTEMPTS_FACTOR
+        while len(chosen) < count:
+            question_id = self.ids[random.randrange(self.size)]
+            attempts -= 1
+            if question_id in chosen_set:
+                continue
+            if question_id in excluded and attempts > 0:
+                continue
+            chosen.append(question_id)
+            chosen_set.add(question_id)
+        return chosen
+
+    def _remember(self, peer_id: int, question_ids: list[int]):
+        recent = self.recent.get(peer_id)
+        if recent is None:
+            recent = deque(
+                maxlen=self.app.config.bot.recent_questions_per_chat
+            )
+            self.recent[peer_id] = recent
+        recent.extend(question_ids)
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import typing
+
+from app.base.base_accessor import BaseAccessor
+from app.store.bot.updates import get_peer_id
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+CONNECT_ATTEMPTS = 60
+READ_LIMIT = 2 ** 24
+
+
+class ShardsAccessor(BaseAccessor):
+    """
+    Splits chats between worker processes by peer_id.
+    The receiver process polls VK and forwards raw updates over unix
+    sockets, each worker handles and owns the games of its chats only.
+    Without bot.workers > 1 the process handles every chat itself.
+    The receiver journals the long poll ts once a batch is forwarded,
+    so updates a worker has queued but not handled are lost if both
+    processes crash, the ones it has applied are skipped if resent.
+    """
+    def __init__(self, app: "Application", *args, **kwargs):
+        super().__init__(app, *args, **kwargs)
+        self.writers: list[asyncio.StreamWriter] = []
+        self.server: asyncio.AbstractServer | None = None
+
+    @property
+    def workers(self) -> int:
+        return self.app.config.bot.workers
+
+    @property
+    def is_receiver(self) -> bool:
+        return self.workers > 1 and self.app.worker_index is None
+
+    @property
+    def is_worker(self) -> bool:
+        return self.app.worker_index is not None
+
+    def socket_path(self, worker_index: int) -> str:
+        return os.path.join(
+            self.app.config.bot.ipc_dir, f"worker-{worker_index}.sock"
+        )
+
+    def shard_of(self, peer_id: int) -> int:
+        return peer_id % self.workers
+
+    def owns(self, peer_id: int) -> bool:
+        if self.is_receiver:
+            return False
+        if self.is_worker:
+            return self.shard_of(peer_id) == self.app.worker_index
+        return True
+
+    async def connect(self, app: "Application"):
+        if self.is_worker:
+            await self.start_server()
+        elif self.is_receiver:
+            for worker_index in range(self.workers):
+                self.writers.append(
+                    await self.connect_worker(worker_index=worker_index)
+                )
+            self.logger.info(f"connected to {self.workers} workers")
+
+    async def disconnect(self, app: "Application"):
+        for writer in self.writers:
+            writer.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def connect_worker(self, worker_index: int) -> asyncio.StreamWriter:
+        path = self.socket_path(worker_index=worker_index)
+        for _ in range(CONNECT_ATTEMPTS):
+            try:
+                _, writer = await asyncio.open_unix_connection(path=path)
+                return writer
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(1)
+        raise ConnectionError(f"worker {worker_index} is not available")
+
+    async def send(self, worker_index: int, message: dict):
+        writer = self.writers[worker_index]
+        writer.write(json.dumps(message).encode() + b"\n")
+        # waits while the worker does not keep up
+        await writer.drain()
+
+    async def route(self, raw_updates: list[dict]):
+        shards: dict[int, list[dict]] = {}
+        for raw_update in raw_updates:
+            peer_id = get_peer_id(raw_update=raw_update)
+            if peer_id is None:
+                continue
+            shard = self.shard_of(peer_id=peer_id)
+            shards.setdefault(shard, []).append(raw_update)
+        for worker_index, shard_updates in shards.items():
+            await self.send(
+                worker_index=worker_index,
+                message=dict(type="updates", updates=shard_updates),
+            )
+
+    async def question_changed(self, question_id: int):
+        if not self.is_receiver:
+            return
+        for worker_index in range(self.workers):
+            await self.send(
+                worker_index=worker_index,
+                message=dict(type="question", id=question_id),
+            )
+
+    async def start_server(self):
+        path = self.socket_path(worker_index=self.app.worker_index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        self.server = await asyncio.start_unix_server(
+            self.handle_connection,
+            path=path,
+            limit=READ_LIMIT,
+        )
+        self.logger.info(f"worker {self.app.worker_index} listens {path}")
+
+    async def handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        try:
+            async for line in reader:
+                await self.handle_message(message=json.loads(line))
+        except Exception as e:
+            self.logger.error("Exception", exc_info=e)
+        finally:
+            writer.close()
+
+    async def handle_message(self, message: dict):
+        match message["type"]:
+            case "updates":
+                # chat noise is dropped here, the receiver only routes
+                await self.app.store.tasks_manager.handle_raw_updates(
+                    raw_updates=message["updates"],
+                )
+            case "question":
+                await self.app.store.question_bank.reload_question(
+                    question_id=message["id"],
+                )
+                self.app.store.state.forget_question(
+                    question_id=message["id"],
+                )
@@ -0,0 +1,344 @@
+import os
+import typing
+from collections import OrderedDict
+from dataclasses import asdict
+
+from app.base.base_accessor import BaseAccessor
+from app.game.dataclasses import (
+    GameDC, GameStateDC, PlayerStateDC, QuestionDC, AnswerDC, UserDC
+)
+from app.store.bot.constants import MAX_USER_FAILURES, QUESTIONS_PER_GAME
+from app.store.bot.matcher import AnswerMatcher
+from app.store.state.events import (
+    EventLog, PlayerJoined, PlayerChanged, AnswerGiven, QuestionMoved,
+    GameFinished,
+)
+from app.store.state.journal import Journal
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+class GameStateAccessor(BaseAccessor):
+    """
+    Authoritative in-memory state of active games keyed by peer_id.
+    Changes are applied here first and recorded as game events,
+    which the event log writes to the database in batches.
+    """
+    def __init__(self, app: "Application", *args, **kwargs):
+        super().__init__(app, *args, **kwargs)
+        self.games: dict[int, GameStateDC] = {}
+        self.matchers: dict[int, AnswerMatcher] = {}
+        self.events: EventLog | None = None
+        # sequence numbers of the GameFinished events by peer_id,
+        # oldest first, a new game of the chat waits for its write
+        self.closing: OrderedDict[int, int] = OrderedDict()
+        # long poll ts of the last handled updates before a restart
+        self.restored_ts: int | None = None
+        # games loaded on startup, their timers are started again
+        self.recovered: list[GameStateDC] = []
+
+    async def connect(self, app: "Application"):
+        config = app.config.bot
+        journal = None
+        # the receiver of a sharded bot holds no games, its journal
+        # keeps the long poll ts of the updates forwarded to workers,
+        # which skip the ones they have applied when VK sends them again
+        if config.state_journal_dir:
+            name = "events"
+            if app.worker_index is not None:
+                name = f"events-{app.worker_index}"
+            journal = Journal(
+                path=os.path.join(config.state_journal_dir, name)
+            )
+            await journal.start()
+        self.events = EventLog(
+            game=app.store.game,
+            flush_interval=config.state_flush_interval,
+            flush_size=config.state_flush_size,
+            journal=journal,
+            snapshot=self.take_snapshot if journal else None,
+            snapshot_interval=config.state_snapshot_interval,
+            acknowledged_ts=self.acknowledged_ts,
+            max_retries=config.state_flush_max_retries,
+        )
+        if journal:
+            snapshot, changed, ts = await self.events.recover()
+            self.restored_ts = ts
+            await self.load_games(snapshot=snapshot, changed=changed)
+            # the next restart starts from the state just rebuilt
+            await journal.save_snapshot(
+                snapshot=self.take_snapshot(),
+                segment=journal.segment - 1,
+            )
+        else:
+            await self.load_games()
+        self.recovered = list(self.games.values())
+        self.logger.info(f"loaded {len(self.games)} active games")
+        self.events.start()
+
+    async def flush(self, app: "Application"):
+        if self.events:
+            await self.events.close()
+
+    def get_metrics(self) -> dict:
+        return dict(
+            active_games=len(self.games),
+            pending_events=len(self.events.pending),
+            written_events=self.events.written,
+            failed_flushes=self.events.failed_flushes,
+            dropped_events=self.events.dropped,
+        )
+
+    def acknowledged_ts(self) -> int | None:
+        """
+        long poll ts whose updates are all handled
+        """
+        poller = self.app.store.vk_api.poller
+        if poller:
+            ts = poller.acknowledged_ts()
+            if ts is not None:
+                return ts
+        return self.restored_ts
+
+    def take_snapshot(self) -> dict:
+        """
+        compact copy of the active games, the long poll ts and
+        the updates applied, questions are kept as ids of the
+        question bank
+        """
+        return dict(
+            ts=self.acknowledged_ts(),
+            event_ids=list(self.events.applied_event_ids),
+            games=[
+                dict(
+                    game_id=game_state.game.id,
+                    question_ids=[
+                        question.id for question in game_state.questions
+                    ],
+                    question_index=game_state.question_index,
+                    players=[
+                        asdict(player)
+                        for player in game_state.players.values()
+                    ],
+                )
+                for game_state in self.games.values()
+            ],
+        )
+
+    def restore_game(self, game: GameDC, data: dict) -> GameStateDC | None:
+        """
+        return None if a question is no longer in the question bank
+        """
+        questions = [
+            self.app.store.question_bank.get(question_id=question_id)
+            for question_id in data["question_ids"]
+        ]
+        if None in questions:
+            return None
+        players = {}
+        for player in data["players"]:
+            user = UserDC(**player.pop("user"))
+            players[user.vk_id] = PlayerStateDC(user=user, **player)
+        return GameStateDC(
+            game=game,
+            questions=questions,
+            question_index=data["question_index"],
+            players=players,
+        )
+
+    async def load_games(
+        self,
+        snapshot: dict | None = None,
+        changed: set[int] | None = None,
+    ):
+        """
+        games unchanged since the snapshot are restored from it,
+        the others are read from the database
+        """
+        restored = {}
+        if snapshot:
+            restored = {data["game_id"]: data for data in snapshot["games"]}
+        changed = changed or set()
+        games = await self.app.store.game.list_games(
+            page=None,
+            in_process=True,
+        )
+        for game in games:
+            if not self.app.store.shards.owns(peer_id=game.peer_id):
+                continue
+            game_state = None
+            if game.id in restored and game.id not in changed:
+                game_state = self.restore_game(
+                    game=game,
+                    data=restored[game.id],
+                )
+            if game_state is None:
+                game_state = await self.load_game(game=game)
+            self.games[game.peer_id] = game_state
+            self.build_matchers(questions=game_state.questions)
+
+    async def load_game(self, game: GameDC) -> GameStateDC:
+        questions = await self.app.store.game.list_game_questions(
+            game_id=game.id,
+        )
+        users = await self.app.store.game.list_users(
+            page=None,
+            game_id=game.id,
+        )
+        statistics = await self.app.store.game.list_user_statistics(
+            page=None,
+            game_id=game.id,
+        )
+        users_by_id = {user.id: user for user in users}
+        players = {}
+        for user_statistics in statistics:
+            user = users_by_id[user_statistics.user_id]
+            players[user.vk_id] = PlayerStateDC(
+                user=user,
+                is_creator=user_statistics.is_creator,
+                points=user_statistics.points,
+                failures=user_statistics.failures,
+                is_lost=user_statistics.is_lost,
+            )
+        return GameStateDC(
+            game=game,
+            questions=questions,
+            question_index=game.current_index,
+            players=players,
+        )
+
+    def get_game(self, peer_id: int) -> GameStateDC | None:
+        return self.games.get(peer_id)
+
+    async def create_game(self, peer_id: int) -> GameStateDC | None:
+        """
+        return None if the question bank is empty, raise
+        EventLogTimeout if the previous game of the chat
+        is not closed in the database in time
+        """
+        questions = self.app.store.question_bank.sample(
+            peer_id=peer_id,
+            count=QUESTIONS_PER_GAME,
+        )
+        if not questions:
+            return None
+        # the previous game of the chat must be closed in the database
+        through = self.closing.get(peer_id)
+        if through is not None:
+            await self.events.sync(
+                through=through,
+                timeout=self.app.config.bot.state_sync_timeout,
+            )
+            self.closing.pop(peer_id, None)
+        game = await self.app.store.game.create_game(
+            peer_id=peer_id,
+            question_ids=[question.id for question in questions],
+        )
+        game_state = GameStateDC(game=game, questions=questions)
+        self.games[peer_id] = game_state
+        self.build_matchers(questions=questions)
+        return game_state
+
+    def get_matcher(self, question: QuestionDC) -> AnswerMatcher:
+        matcher = self.matchers.get(question.id)
+        if matcher is None:
+            matcher = AnswerMatcher(answers=question.answers)
+            self.matchers[question.id] = matcher
+        return matcher
+
+    def build_matchers(self, questions: list[QuestionDC]):
+        for question in questions:
+            self.get_matcher(question=question)
+
+    def forget_question(self, question_id: int):
+        self.matchers.pop(question_id, None)
+
+    def match_answer(self, game: GameStateDC, text: str) -> AnswerDC | None:
+        question = game.active_question
+        if question is None:
+            return None
+        return self.get_matcher(question=question).match(text=text)
+
+    def add_player(
+        self,
+        game: GameStateDC,
+        user: UserDC,
+        is_creator: bool = False,
+    ) -> PlayerStateDC:
+        player = PlayerStateDC(user=user, is_creator=is_creator)
+        game.players[user.vk_id] = player
+        self.events.add(PlayerJoined(
+            game_id=game.game.id,
+            user_id=user.id,
+            is_creator=is_creator,
+        ))
+        return player
+
+    def add_fail(self, game: GameStateDC, player: PlayerStateDC) -> bool:
+        """
+        return True if the player has just run out of attempts
+        """
+        player.failures += 1
+        has_lost = player.failures == MAX_USER_FAILURES
+        if has_lost:
+            player.is_lost = True
+        self.player_changed(game=game, player=player)
+        return has_lost
+
+    def player_changed(self, game: GameStateDC, player: PlayerStateDC):
+        self.events.add(PlayerChanged(
+            game_id=game.game.id,
+            user_id=player.user.id,
+            points=player.points,
+            failures=player.failures,
+            is_lost=player.is_lost,
+        ))
+
+    def add_points(
+        self,
+        game: GameStateDC,
+        player: PlayerStateDC,
+        answer: AnswerDC,
+    ):
+        player.points += answer.score
+        self.player_changed(game=game, player=player)
+        self.events.add(AnswerGiven(
+            game_id=game.game.id,
+            user_id=player.user.id,
+            answer_id=answer.id,
+        ))
+
+    def move_to_next_question(self, game: GameStateDC) -> QuestionDC | None:
+        game.question_index += 1
+        # the cursor stays on the last question once the game is over
+        if game.active_question is not None:
+            self.events.add(QuestionMoved(
+                game_id=game.game.id,
+                current_index=game.question_index,
+            ))
+        return game.active_question
+
+    def end_game(self, game: GameStateDC) -> PlayerStateDC | None:
+        self.games.pop(game.game.peer_id, None)
+        game.game.in_process = False
+        peer_id = game.game.peer_id
+        self.closing.pop(peer_id, None)
+        self.closing[peer_id] = self.events.add(
+            GameFinished(game_id=game.game.id)
+        )
+        while (
+            self.closing
+            and next(iter(self.closing.values())) <= self.events.written
+        ):
+            self.closing.popitem(last=False)
+        # players are kept in join order, so min keeps the
+        # tie-breaking of finish_game: fewer failures, then joined first
+        return min(
+            (
+                player for player in game.players.values()
+                if not player.is_lost
+            ),
+            key=lambda player: (-player.points, player.failures),
+            default=None,
+        )
@@ -0,0 +1,405 @@
+import asyncio
+import time
+import typing
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from logging import getLogger
+from typing import Callable
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+if typing.TYPE_CHECKING:
+    from app.store.game.accessor import GameAccessor
+    from app.store.state.journal import Journal
+
+# keeps statements well below the bind parameters limit
+MAX_ROWS_PER_STATEMENT = 1000
+# errors caused by the rows themselves, unlike an outage
+# they fail every retry of the same batch
+REJECTION_ERRORS = (DataError, IntegrityError)
+# event_ids of applied updates remembered to skip the ones
+# VK delivers again after a restart
+APPLIED_EVENT_IDS = 10000
+
+current_event_id: ContextVar[str | None] = ContextVar(
+    "current_event_id", default=None
+)
+
+
+@dataclass
+class PlayerJoined:
+    game_id: int
+    user_id: int
+    is_creator: bool = False
+
+
+@dataclass
+class PlayerChanged:
+    """
+    points, failures and is_lost of a player after a guess,
+    absolute values make replaying an event harmless
+    """
+    game_id: int
+    user_id: int
+    points: int
+    failures: int
+    is_lost: bool
+
+
+@dataclass
+class AnswerGiven:
+    game_id: int
+    user_id: int
+    answer_id: int
+
+
+@dataclass
+class QuestionMoved:
+    game_id: int
+    current_index: int
+
+
+@dataclass
+class GameFinished:
+    game_id: int
+
+
+@dataclass
+class PollAcknowledged:
+    """
+    long poll ts whose updates are all handled, journaled with
+    the batch that holds their events, it is not a game event
+    """
+    ts: int
+
+
+@dataclass
+class UpdateApplied:
+    """
+    event_id of the update whose game events follow, journaled
+    before the first of them, it is not a game event
+    """
+    event_id: str
+
+
+GameEvent = (
+    PlayerJoined | PlayerChanged | AnswerGiven | QuestionMoved | GameFinished
+)
+JournalRecord = GameEvent | PollAcknowledged | UpdateApplied
+EVENT_TYPES = {
+    event_type.__name__: event_type
+    for event_type in typing.get_args(JournalRecord)
+}
+
+
+class EventLogTimeout(Exception):
+    """
+    events were not written in time, e.g. while the database is down
+    """
+
+
+def event_to_dict(event: JournalRecord) -> dict:
+    return dict(type=type(event).__name__, **asdict(event))
+
+
+def event_from_dict(data: dict) -> JournalRecord:
+    data = dict(data)
+    return EVENT_TYPES[data.pop("type")](**data)
+
+
+def chunks(rows: list, size: int = MAX_ROWS_PER_STATEMENT):
+    for index in range(0, len(rows), size):
+        yield rows[index:index + size]
+
+
+class EventLog:
+    """
+    Collects game events and writes them to the database in one
+    transaction of a few multi-row statements, every flush_interval
+    seconds or as soon as flush_size events are pending. Events are
+    appended to the journal first, a failed write is retried with
+    the next flush. Every snapshot_interval seconds a flush also saves
+    the snapshot returned by the given callable, taken as the batch
+    is cut, so it matches the events written up to it. The long poll
+    ts given by acknowledged_ts is journaled with every batch, so a
+    restart resumes polling right after the last written one.
+    A batch the database keeps rejecting for its rows is written
+    event by event after max_retries flushes, the rejected events
+    are dropped to the journal's dead letter file.
+    The event_id of the update being applied is journaled before its
+    first event, so after a restart the updates VK delivers again
+    from the acknowledged ts are skipped instead of applied twice.
+    """
+    def __init__(
+        self,
+        game: "GameAccessor",
+        flush_interval: float,
+        flush_size: int,
+        journal: "Journal | None" = None,
+        snapshot: Callable[[], dict] | None = None,
+        snapshot_interval: float = 5.0,
+        acknowledged_ts: Callable[[], int | None] | None = None,
+        max_retries: int = 5,
+    ):
+        self.game = game
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.journal = journal
+        self.snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_at = time.monotonic() + snapshot_interval
+        self.acknowledged_ts = acknowledged_ts
+        self.journaled_ts: int | None = None
+        self.pending: list[GameEvent] = []
+        self.lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.progress = asyncio.Condition()
+        self.flush_task: asyncio.Task | None = None
+        self.added = 0
+        self.written = 0
+        self.failed_flushes = 0
+        self.max_retries = max_retries
+        self.rejections = 0
+        self.dropped = 0
+        self.applied_event_ids: deque[str] = deque()
+        self.applied_event_ids_set: set[str] = set()
+        self.logger = getLogger("event_log")
+
+    def start(self):
+        self.flush_task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+        await self.flush()
+        if self.journal:
+            self.journal.close()
+
+    def add(self, event: GameEvent) -> int:
+        """
+        return the sequence number of the event, 1-based
+        """
+        self.pending.append(event)
+        self.added += 1
+        if self.journal:
+            self.journal_update()
+            self.journal.append(event)
+        if len(self.pending) >= self.flush_size:
+            self.wakeup.set()
+        return self.added
+
+    @contextmanager
+    def applying(self, event_id: str | None):
+        """
+        attribute the events added inside to the given update
+        """
+        token = current_event_id.set(event_id)
+        try:
+            yield
+        finally:
+            current_event_id.reset(token)
+
+    def is_applied(self, event_id: str | None) -> bool:
+        return event_id in self.applied_event_ids_set
+
+    def journal_update(self):
+        event_id = current_event_id.get()
+        if event_id is None or self.is_applied(event_id=event_id):
+            return
+        self.remember_applied(event_id=event_id)
+        self.journal.append(UpdateApplied(event_id=event_id))
+
+    def remember_applied(self, event_id: str):
+        self.applied_event_ids.append(event_id)
+        self.applied_event_ids_set.add(event_id)
+        if len(self.applied_event_ids) > APPLIED_EVENT_IDS:
+            self.applied_event_ids_set.discard(
+                self.applied_event_ids.popleft()
+            )
+
+    async def sync(
+        self,
+        through: int | None = None,
+        timeout: float | None = None,
+    ):
+        """
+        wait until the events up to the given sequence number, or all
+        added so far, are written. the write itself runs in the flush
+        task, outside any transaction of the caller. raise
+        EventLogTimeout if it takes longer than timeout seconds
+        """
+        target = self.added if through is None else through
+        try:
+            await asyncio.wait_for(
+                self.wait_written(target=target),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            raise EventLogTimeout(
+                f"{self.written} of {target} events written"
+            ) from None
+
+    async def wait_written(self, target: int):
+        async with self.progress:
+            while self.written < target:
+                self.wakeup.set()
+                await self.progress.wait()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self.wakeup.wait(),
+                    timeout=self.flush_interval,
+                )
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            if self.journal:
+                await self.journal.prepare()
+            snapshot = self.take_snapshot()
+            ts = self.journal_ts()
+            if not self.pending and snapshot is None and ts is None:
+                return
+            # events added from here on go to the next segment
+            events, self.pending = self.pending, []
+            try:
+                if self.journal:
+                    segment = await self.journal.rotate()
+                if events:
+                    await self.write_batch(events=events)
+            except asyncio.CancelledError:
+                self.pending[:0] = events
+                raise
+            except Exception as e:
+                self.logger.error("Exception", exc_info=e)
+                self.failed_flushes += 1
+                self.pending[:0] = events
+                return
+            self.written += len(events)
+            if self.journal:
+                self.journal.commit(segment=segment)
+                if snapshot is not None:
+                    await self.journal.save_snapshot(
+                        snapshot=snapshot,
+                        segment=segment,
+                    )
+        async with self.progress:
+            self.progress.notify_all()
+
+    async def write_batch(self, events: list[GameEvent]):
+        try:
+            await self.write(events=events)
+        except REJECTION_ERRORS:
+            self.rejections += 1
+            if self.rejections <= self.max_retries:
+                raise
+            self.logger.error(
+                f"batch of {len(events)} events rejected "
+                f"{self.rejections} times, write them one by one"
+            )
+            await self.isolate(events=events)
+        self.rejections = 0
+
+    async def isolate(self, events: list[GameEvent]):
+        """
+        write every event on its own, dropping the rejected ones
+        """
+        rejected = []
+        for event in events:
+            try:
+                await self.write(events=[event])
+            except REJECTION_ERRORS as e:
+                self.logger.error(f"drop {event}: {e}")
+                rejected.append(event)
+        self.dropped += len(rejected)
+        if rejected and self.journal:
+            await self.journal.dead_letter(events=rejected)
+
+    def take_snapshot(self) -> dict | None:
+        if self.snapshot is None or time.monotonic() < self.snapshot_at:
+            return None
+        self.snapshot_at = time.monotonic() + self.snapshot_interval
+        return self.snapshot()
+
+    def journal_ts(self) -> int | None:
+        """
+        journal the acknowledged long poll ts if it has moved, return
+        it or None. called as the batch is cut, so the events of the
+        updates it covers are all in the batch or written before it
+        """
+        if self.journal is None or self.acknowledged_ts is None:
+            return None
+        ts = self.acknowledged_ts()
+        if ts is None or ts == self.journaled_ts:
+            return None
+        self.journaled_ts = ts
+        self.journal.append(PollAcknowledged(ts=ts))
+        return ts
+
+    async def recover(self) -> tuple[dict | None, set[int], int | None]:
+        """
+        write the events a crashed process left unwritten and
+        remember the updates applied, return the last snapshot,
+        ids of the games changed after it and the last long poll
+        ts whose updates are written
+        """
+        snapshot = self.journal.load_snapshot()
+        committed, pending = self.journal.read(
+            after=snapshot["segment"] if snapshot else 0,
+        )
+        if pending:
+            await self.write(events=pending)
+            self.logger.info(f"replayed {len(pending)} journal records")
+        ts = snapshot["ts"] if snapshot else None
+        for event_id in snapshot.get("event_ids", []) if snapshot else []:
+            self.remember_applied(event_id=event_id)
+        changed = set()
+        for record in committed + pending:
+            match record:
+                case PollAcknowledged():
+                    ts = record.ts
+                case UpdateApplied():
+                    self.remember_applied(event_id=record.event_id)
+                case _:
+                    changed.add(record.game_id)
+        return snapshot, changed, ts
+
+    async def write(self, events: list[JournalRecord]):
+        players: dict[tuple[int, int], dict] = {}
+        changes: dict[tuple[int, int], dict] = {}
+        answers: list[dict] = []
+        progress: dict[int, dict] = {}
+        finished: list[int] = []
+        # repeated changes of a row collapse to the latest one
+        for event in events:
+            match event:
+                case PlayerJoined(game_id=game_id, user_id=user_id):
+                    players[(game_id, user_id)] = asdict(event)
+                case PlayerChanged(game_id=game_id, user_id=user_id):
+                    changes[(game_id, user_id)] = asdict(event)
+                case AnswerGiven():
+                    answers.append(asdict(event))
+                case QuestionMoved(game_id=game_id):
+                    progress[game_id] = asdict(event)
+                case GameFinished(game_id=game_id):
+                    finished.append(game_id)
+
+        async with self.game.app.database.unit_of_work():
+            for rows in chunks(list(players.values())):
+                await self.game.add_players(rows=rows)
+            for rows in chunks(list(changes.values())):
+                await self.game.update_players(rows=rows)
+            for rows in chunks(answers):
+                await self.game.add_game_answers(rows=rows)
+            for rows in chunks(list(progress.values())):
+                await self.game.update_progress(rows=rows)
+            for game_id in finished:
+                await self.game.finish_game(game_id=game_id)
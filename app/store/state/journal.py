@@ -0,0 +1,191 @@
+import asyncio
+import glob
+import json
+import os
+from logging import getLogger
+from typing import TextIO
+
+from app.store.state.events import (
+    JournalRecord, event_from_dict, event_to_dict
+)
+
+COMMITTED_SUFFIX = ".done"
+
+
+class Journal:
+    """
+    Append-only file of game events split into numbered segments,
+    along with the long poll ts acknowledged as each batch is cut.
+    The segment being written is sealed before its events go to the
+    database and marked committed once they are written. Segments are
+    deleted when a snapshot of the game state covers them, so after
+    a crash the snapshot and the segments left tell which games
+    changed since and which events still have to be written.
+    Files are opened off the event loop, the next segment ahead
+    of time, so appends never go to a segment being sealed.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.logger = getLogger("journal")
+        self.segment = 0
+        self.file: TextIO | None = None
+        self.next_file: TextIO | None = None
+
+    async def start(self):
+        """
+        open a segment after the ones left on disk
+        """
+        await asyncio.to_thread(
+            os.makedirs, os.path.dirname(self.path) or ".", exist_ok=True
+        )
+        self.segment = max(
+            (number for number, _ in self.segments()), default=0
+        ) + 1
+        self.file = await self.open_segment(self.segment)
+        self.next_file = await self.open_segment(self.segment + 1)
+
+    async def prepare(self):
+        """
+        reopen the next segment if a cancelled rotate left it closed
+        """
+        if self.next_file is None:
+            self.next_file = await self.open_segment(self.segment + 1)
+
+    async def open_segment(self, segment: int) -> TextIO:
+        return await asyncio.to_thread(open, self.segment_path(segment), "a")
+
+    @property
+    def snapshot_path(self) -> str:
+        return f"{self.path}.snapshot"
+
+    @property
+    def dead_letter_path(self) -> str:
+        return f"{self.path}.dead"
+
+    def segment_path(self, segment: int, committed: bool = False) -> str:
+        path = f"{self.path}.{segment}"
+        if committed:
+            path += COMMITTED_SUFFIX
+        return path
+
+    def segments(self) -> list[tuple[int, bool]]:
+        """
+        return numbers of the segments on disk in order,
+        each with whether it is committed
+        """
+        segments = []
+        for path in glob.glob(f"{glob.escape(self.path)}.*"):
+            committed = path.endswith(COMMITTED_SUFFIX)
+            if committed:
+                path = path.removesuffix(COMMITTED_SUFFIX)
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                segments.append((int(suffix), committed))
+        return sorted(segments)
+
+    def append(self, event: JournalRecord):
+        # flushed to the OS, which outlives a crash of the process
+        self.file.write(json.dumps(event_to_dict(event)) + "\n")
+        self.file.flush()
+
+    async def rotate(self) -> int:
+        """
+        seal the current segment and return its number,
+        the switch to the next one happens before any await
+        """
+        sealed, file = self.segment, self.file
+        self.segment += 1
+        self.file, self.next_file = self.next_file, None
+        await asyncio.to_thread(os.fsync, file.fileno())
+        await asyncio.to_thread(file.close)
+        self.next_file = await self.open_segment(self.segment + 1)
+        return sealed
+
+    def commit(self, segment: int):
+        """
+        mark sealed segments up to the given one as written
+        """
+        for number, committed in self.segments():
+            if number <= segment and number != self.segment and not committed:
+                os.replace(
+                    self.segment_path(number),
+                    self.segment_path(number, committed=True),
+                )
+
+    def drop_through(self, segment: int):
+        """
+        delete sealed segments up to the given one
+        """
+        for number, committed in self.segments():
+            if number <= segment and number != self.segment:
+                os.remove(self.segment_path(number, committed=committed))
+
+    def read(
+        self,
+        after: int = 0,
+    ) -> tuple[list[JournalRecord], list[JournalRecord]]:
+        """
+        return the committed and the not committed events of sealed
+        segments after the given one in order, a line cut by a crash
+        is skipped
+        """
+        committed_events, pending_events = [], []
+        for number, committed in self.segments():
+            if number <= after or number >= self.segment:
+                continue
+            events = committed_events if committed else pending_events
+            path = self.segment_path(number, committed=committed)
+            with open(path) as f:
+                for line in f:
+                    try:
+                        events.append(event_from_dict(json.loads(line)))
+                    except ValueError:
+                        self.logger.warning(
+                            f"skip broken journal line: {line!r}"
+                        )
+        return committed_events, pending_events
+
+    async def dead_letter(self, events: list[JournalRecord]):
+        """
+        keep events the database rejected for a manual look
+        """
+        lines = "".join(
+            json.dumps(event_to_dict(event)) + "\n" for event in events
+        )
+        await asyncio.to_thread(self._append_dead_letter, lines)
+
+    def _append_dead_letter(self, lines: str):
+        with open(self.dead_letter_path, "a") as f:
+            f.write(lines)
+
+    def load_snapshot(self) -> dict | None:
+        try:
+            with open(self.snapshot_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            self.logger.warning("skip broken snapshot")
+            return None
+
+    async def save_snapshot(self, snapshot: dict, segment: int):
+        """
+        replace the snapshot with one that covers the events up to
+        the given segment and delete those segments
+        """
+        snapshot = dict(snapshot, segment=segment)
+        await asyncio.to_thread(self._write_snapshot, snapshot)
+        self.drop_through(segment=segment)
+
+    def _write_snapshot(self, snapshot: dict):
+        path = self.snapshot_path + ".tmp"
+        with open(path, "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path, self.snapshot_path)
+
+    def close(self):
+        for file in (self.file, self.next_file):
+            if file:
+                file.close()
@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+import json
+import time
+import typing
+from bisect import bisect_left
+from contextvars import ContextVar, Token
+from functools import wraps
+from typing import Callable, TextIO
+
+from app.base.base_accessor import BaseAccessor
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+# seconds, the upper bounds of the histogram buckets
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+METRICS_PREFIX = "vkbot"
+
+current_trace_id: ContextVar[int | None] = ContextVar(
+    "current_trace_id", default=None
+)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        # the last slot counts values above the largest bucket
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class TracingAccessor(BaseAccessor):
+    """
+    Times spans of updates, handlers, accessor calls and VK API
+    methods into histograms served at /metrics. Every update gets
+    a trace id carried by a contextvar, spans are optionally written
+    to a JSON lines log tagged with it.
+    """
+    def __init__(self, app: "Application", *args, **kwargs):
+        super().__init__(app, *args, **kwargs)
+        self.enabled = app.config.tracing.enabled
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self.trace_ids = itertools.count(1)
+        self.spans: list[str] = []
+        self.trace_log: TextIO | None = None
+        self.flush_task: asyncio.Task | None = None
+
+    async def connect(self, app: "Application"):
+        config = app.config.tracing
+        if not self.enabled or not config.trace_log:
+            return
+        # opened off the event loop, closed on cleanup by disconnect
+        self.trace_log = await asyncio.to_thread(open, config.trace_log, "a")
+        self.flush_task = asyncio.create_task(
+            self.flush_spans(interval=config.flush_interval)
+        )
+
+    async def disconnect(self, app: "Application"):
+        if self.flush_task:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+        if self.trace_log:
+            try:
+                self.write_spans()
+            finally:
+                await asyncio.to_thread(self.trace_log.close)
+                self.trace_log = None
+
+    async def flush_spans(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.write_spans()
+
+    def write_spans(self):
+        if not self.spans:
+            return
+        spans, self.spans = self.spans, []
+        self.trace_log.write("".join(spans))
+        self.trace_log.flush()
+
+    def start_trace(self) -> Token:
+        return current_trace_id.set(next(self.trace_ids))
+
+    def end_trace(self, token: Token):
+        current_trace_id.reset(token)
+
+    def record(self, kind: str, name: str, started_at: float):
+        """
+        close the span started at the given perf_counter reading
+        """
+        if not self.enabled:
+            return
+        duration = time.perf_counter() - started_at
+        histogram = self.histograms.get((kind, name))
+        if histogram is None:
+            histogram = self.histograms[(kind, name)] = Histogram()
+        histogram.observe(duration)
+        if self.trace_log:
+            self.spans.append(json.dumps(dict(
+                trace_id=current_trace_id.get(),
+                kind=kind,
+                name=name,
+                duration=duration,
+                at=time.time(),
+            )) + "\n")
+
+    def render(self) -> str:
+        """
+        histograms and gauges in the Prometheus text format
+        """
+        metric = f"{METRICS_PREFIX}_span_duration_seconds"
+        lines = [
+            f"# HELP {metric} Duration of traced spans.",
+            f"# TYPE {metric} histogram",
+        ]
+        for (kind, name), histogram in sorted(self.histograms.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}'
+            )
+            lines.append(f"{metric}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+        store = self.app.store
+        gauges = dict(
+            tasks_manager=store.tasks_manager.get_metrics(),
+            state=store.state.get_metrics(),
+            vk_api=store.vk_api.get_metrics(),
+            database_pool=self.app.database.get_pool_stats(),
+        )
+        for name, value in flatten(gauges, prefix=METRICS_PREFIX):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def flatten(metrics: dict, prefix: str):
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            yield from flatten(value, prefix=f"{prefix}_{key}")
+        else:
+            yield f"{prefix}_{key}", value
+
+
+def traced(kind: str):
+    """
+    time every call of a coroutine method of an object
+    that has the application as app
+    """
+    def decorator(func: Callable):
+        name = func.__qualname__
+
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            tracing = self.app.store.tracing
+            if not tracing.enabled:
+                return await func(self, *args, **kwargs)
+            started_at = time.perf_counter()
+            try:
+                return await func(self, *args, **kwargs)
+            finally:
+                tracing.record(kind=kind, name=name, started_at=started_at)
+        return wrapper
+    return decorator
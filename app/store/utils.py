@@ -17,7 +17,7 @@ def add_db_session_to_accessor(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
         self: BaseAccessor = args[0]
-        async with self.app.database.session.begin() as session:
+        async with self.app.database.unit_of_work() as session:
             kwargs["session"] = session
             result = await func(*args, **kwargs)
         return result
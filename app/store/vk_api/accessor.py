@@ -1,23 +1,29 @@
+import asyncio
 import random
+import time
 import typing
 import json
+from typing import Any
+from urllib.parse import unquote
 
 from aiohttp import TCPConnector
 from aiohttp.client import ClientSession
 
 from app.base.base_accessor import BaseAccessor
 
-from app.store.bot.updates import UpdateEvent, UpdateMessage
-
 from app.game.dataclasses import UserDC
 from app.store.vk_api.poller import Poller
+from app.store.vk_api.batcher import ExecuteBatcher
+from app.store.vk_api.errors import (
+    VkApiError, TOO_MANY_REQUESTS, INTERNAL_SERVER_ERROR
+)
+from app.store.vk_api.rate_limiter import RateLimiter, Priority, backoff
+from app.store.vk_api.profiles import ProfileCache, ProfilesResolver
 from app.store.bot.keyboards import Keyboard
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
-API_PATH = "https://api.vk.com/method/"
-
 
 class VkApiAccessor(BaseAccessor):
     def __init__(self, app: "Application", *args, **kwargs):
@@ -26,24 +32,64 @@ class VkApiAccessor(BaseAccessor):
         self.key: str | None = None
         self.server: str | None = None
         self.poller: Poller | None = None
+        self.batcher: ExecuteBatcher | None = None
+        self.rate_limiter: RateLimiter | None = None
+        self.profiles: ProfilesResolver | None = None
         self.ts: int | None = None
+        self.retries = 0
 
     async def connect(self, app: "Application"):
         self.session = ClientSession(connector=TCPConnector(verify_ssl=False))
+        # the token's rate limit is shared by every worker process
+        self.rate_limiter = RateLimiter(
+            rate=app.config.bot.api_rate_limit / app.config.bot.workers
+        )
+        self.batcher = ExecuteBatcher(
+            vk_api=self,
+            flush_interval=app.config.bot.execute_flush_interval,
+            max_retries=app.config.bot.api_max_retries,
+        )
+        self.profiles = ProfilesResolver(
+            vk_api=self,
+            cache=ProfileCache(
+                max_size=app.config.bot.profile_cache_size,
+                ttl=app.config.bot.profile_cache_ttl,
+            ),
+            flush_interval=app.config.bot.execute_flush_interval,
+        )
+        if app.store.shards.is_worker:
+            return
+        self.poller = Poller(
+            app.store,
+            queue_size=app.config.bot.poller_queue_size,
+        )
+        if app.config.bot.mode == "callback":
+            self.logger.info("wait for callback api updates")
+            await self.poller.start(poll=False)
+            return
+        # resume after the updates handled before a restart
+        self.ts = app.store.state.restored_ts
         try:
-            await self._get_long_poll_service()
+            await self._get_long_poll_service(refresh_ts=False)
         except Exception as e:
             self.logger.error("Exception", exc_info=e)
-        self.poller = Poller(app.store)
         self.logger.info("start polling")
         await self.poller.start()
 
     async def disconnect(self, app: "Application"):
-        if self.session:
-            await self.session.close()
+        # only stops receiving, handlers still running reply
+        # until close() after the tasks manager is drained
         if self.poller:
             await self.poller.stop()
 
+    async def close(self, app: "Application"):
+        if self.profiles:
+            await self.profiles.close()
+        if self.batcher:
+            await self.batcher.close()
+        if self.session:
+            await self.session.close()
+
     @staticmethod
     def _build_query(host: str, method: str, params: dict) -> str:
         url = host + method + "?"
@@ -52,25 +98,51 @@ class VkApiAccessor(BaseAccessor):
         url += "&".join([f"{k}={v}" for k, v in params.items()])
         return url
 
-    async def _get_long_poll_service(self):
-        async with self.session.get(
-            self._build_query(
-                host=API_PATH,
-                method="groups.getLongPollServer",
-                params={
-                    "group_id": self.app.config.bot.group_id,
-                    "access_token": self.app.config.bot.token,
-                },
+    def backlog(self) -> int:
+        """
+        requests held back by the rate limiter plus execute
+        batches sent and not answered yet
+        """
+        return len(self.rate_limiter.waiters) + self.batcher.in_flight_batches
+
+    def get_metrics(self) -> dict:
+        metrics = dict(
+            rate_limiter=self.rate_limiter.get_metrics(),
+            pending_calls=self.batcher.pending_calls,
+            in_flight_batches=self.batcher.in_flight_batches,
+            retries=self.retries + self.batcher.retries,
+        )
+        if self.poller:
+            metrics["poller"] = dict(
+                duplicate_updates=self.poller.duplicate_updates,
+                dropped_updates=self.poller.dropped_updates,
             )
-        ) as resp:
-            data = (await resp.json())["response"]
-            self.logger.info(data)
-            self.key = data["key"]
-            self.server = data["server"]
+        return metrics
+
+    async def _get_long_poll_service(self, refresh_ts: bool = True):
+        data = (await self._request(
+            "groups.getLongPollServer",
+            {"group_id": self.app.config.bot.group_id},
+        ))["response"]
+        self.logger.info(data)
+        self.key = data["key"]
+        self.server = data["server"]
+        if refresh_ts or self.ts is None:
             self.ts = data["ts"]
-            self.logger.info(self.server)
+        self.logger.info(self.server)
 
-    async def poll(self):
+    def push_updates(self, raw_updates: list[dict]) -> bool:
+        """
+        queue updates received by push for dispatch, return False
+        if the dispatch queue is full and they are dropped
+        """
+        return self.poller.push(raw_updates=raw_updates)
+
+    async def poll(self) -> list[dict]:
+        """
+        return raw updates of one a_check round, refreshing
+        the long poll server when VK reports it as failed
+        """
         async with self.session.get(
             self._build_query(
                 host=self.server,
@@ -79,40 +151,129 @@ class VkApiAccessor(BaseAccessor):
                     "act": "a_check",
                     "key": self.key,
                     "ts": self.ts,
-                    "wait": 30,
+                    "wait": 25,
                 },
             )
         ) as resp:
             data = await resp.json()
-            self.logger.info(data)
-            self.ts = data["ts"]
-            raw_updates = data.get("updates", [])
-            updates = []
-            for update in raw_updates:
-                upd_obj = update["object"]
-                if upd_obj.get("message"):
-                    message = upd_obj.get("message")
-                    updates.append(
-                        UpdateMessage(
-                            app=self.app,
-                            user_id=message["from_id"],
-                            text=message["text"],
-                            peer_id=message["peer_id"],
-                            event_id=update["event_id"],
-                            cmd=message["conversation_message_id"],
-                        )
+        self.logger.debug(data)
+
+        match data.get("failed"):
+            case None:
+                self.ts = data["ts"]
+                return data.get("updates", [])
+            case 1:
+                self.ts = data["ts"]
+            case 2:
+                await self._get_long_poll_service(refresh_ts=False)
+            case _:
+                await self._get_long_poll_service()
+        self.logger.warning(f"long poll failed: {data}")
+        return []
+
+    async def _request(
+        self,
+        method: str,
+        params: dict,
+        priority: int = Priority.high,
+    ) -> dict:
+        """
+        send a method request, retried with backoff while VK
+        reports it as throttled or failed on its side
+        """
+        attempt = 0
+        while True:
+            try:
+                return await self._send(
+                    method=method,
+                    params=params,
+                    priority=priority,
+                )
+            except VkApiError as e:
+                if (
+                    not e.is_retryable
+                    or attempt >= self.app.config.bot.api_max_retries
+                ):
+                    raise
+                self.retries += 1
+                self.logger.warning(
+                    f"retry {method} in attempt {attempt + 1}: {e}"
+                )
+                await asyncio.sleep(backoff(attempt=attempt))
+                attempt += 1
+
+    async def _send(
+        self,
+        method: str,
+        params: dict,
+        priority: int = Priority.high,
+    ) -> dict:
+        started_at = time.perf_counter()
+        await self.rate_limiter.acquire(priority=priority)
+        try:
+            async with self.session.post(
+                self.app.config.bot.api_url + method,
+                data={
+                    **params,
+                    "access_token": self.app.config.bot.token,
+                    "v": "5.131",
+                },
+            ) as resp:
+                # throttling and server failures may come as plain HTTP
+                # errors, they are retried like the matching API errors
+                if resp.status == 429:
+                    raise VkApiError(
+                        code=TOO_MANY_REQUESTS,
+                        message=f"HTTP {resp.status}",
                     )
-                elif upd_obj.get("event_id"):
-                    updates.append(
-                        UpdateEvent(
-                            app=self.app,
-                            user_id=upd_obj["user_id"],
-                            peer_id=upd_obj["peer_id"],
-                            event_id=upd_obj["event_id"],
-                            payload=upd_obj["payload"],
-                        )
+                if resp.content_type != "application/json":
+                    raise VkApiError(
+                        code=INTERNAL_SERVER_ERROR,
+                        message=f"HTTP {resp.status} {resp.content_type}",
                     )
-            await self.app.store.tasks_manager.handle_updates(updates=updates)
+                data = await resp.json()
+        finally:
+            self.app.store.tracing.record(
+                kind="vk_api",
+                name=method,
+                started_at=started_at,
+            )
+        self.logger.debug(data)
+        if data.get("error"):
+            raise VkApiError.from_dict(data["error"])
+        return data
+
+    async def execute(
+        self,
+        code: str,
+        priority: int = Priority.high,
+    ) -> dict:
+        return await self._request(
+            "execute",
+            {"code": code},
+            priority=priority,
+        )
+
+    async def _call(
+        self,
+        method: str,
+        params: dict,
+        priority: int = Priority.high,
+    ) -> Any:
+        # from the caller's side, batching and retries included
+        started_at = time.perf_counter()
+        try:
+            return await self.batcher.call(
+                method=method,
+                params=params,
+                priority=priority,
+            )
+        finally:
+            self.app.store.tracing.record(
+                kind="vk_call",
+                name=method,
+                started_at=started_at,
+            )
 
     async def send_message(
         self,
@@ -123,27 +284,20 @@ class VkApiAccessor(BaseAccessor):
         """
         return conversation_message_id which helps to edit and delete messages
         """
-        async with self.session.get(
-            self._build_query(
-                API_PATH,
-                "messages.send",
-                params={
-                    "random_id": random.randint(1, 2**32),
-                    "peer_ids": peer_id,
-                    "message": text,
-                    "access_token": self.app.config.bot.token,
-                    "keyboard": json.dumps(keyboard.to_dict())
-                    if keyboard != "" else "",
-                },
-            )
-        ) as resp:
-            data = await resp.json()
-            self.logger.info(data)
-            if data.get("error"):
-                self.logger.error(msg=data["error"]["error_msg"])
-                return None
-            cmd = data["response"][0]["conversation_message_id"]
-            return cmd
+        params = {
+            "random_id": random.randint(1, 2**31 - 1),
+            "peer_ids": peer_id,
+            # texts are prepared for a query string, execute gets them raw
+            "message": unquote(text),
+        }
+        if keyboard != "":
+            params["keyboard"] = json.dumps(keyboard.to_dict())
+        try:
+            response = await self._call("messages.send", params)
+        except VkApiError as e:
+            self.logger.error(msg=e.message)
+            return None
+        return response[0]["conversation_message_id"]
 
     async def edit_message(
         self,
@@ -151,20 +305,18 @@ class VkApiAccessor(BaseAccessor):
         text: str,
         cmd: int,
     ):
-        async with self.session.get(
-            self._build_query(
-                API_PATH,
+        try:
+            await self._call(
                 "messages.edit",
-                params={
+                {
                     "conversation_message_id": cmd,
                     "peer_id": peer_id,
-                    "message": text,
-                    "access_token": self.app.config.bot.token,
+                    "message": unquote(text),
                 },
+                priority=Priority.low,
             )
-        ) as resp:
-            data = await resp.json()
-            self.logger.info(data)
+        except VkApiError as e:
+            self.logger.error(msg=e.message)
 
     async def show_snackbar(
         self,
@@ -173,44 +325,35 @@ class VkApiAccessor(BaseAccessor):
         peer_id: int,
         text: str,
     ):
-        async with self.session.get(
-            self._build_query(
-                API_PATH,
+        try:
+            await self._call(
                 "messages.sendMessageEventAnswer",
-                params={
+                {
                     "event_id": event_id,
                     "user_id": user_id,
                     "peer_id": peer_id,
-                    "access_token": self.app.config.bot.token,
                     "event_data": json.dumps({
                         "type": "show_snackbar",
                         "text": text,
-                    })
+                    }),
                 },
             )
-        ) as resp:
-            data = await resp.json()
-            self.logger.info(data)
+        except VkApiError as e:
+            self.logger.error(msg=e.message)
 
-    async def get_user_info(self, vk_id: int):
-        async with self.session.get(
-            self._build_query(
-                API_PATH,
-                "users.get",
-                params={
-                    "access_token": self.app.config.bot.token,
-                    "user_ids": vk_id,
-                },
-            )
-        ) as resp:
-            data = await resp.json()
-            if data.get("error"):
-                self.logger.error(msg=data["error"]["error_msg"])
-                return None
-            self.logger.info(data)
-            user_data = data["response"][0]
-            return UserDC(
-                vk_id=vk_id,
+    async def get_user_info(self, vk_id: int) -> UserDC | None:
+        return await self.profiles.resolve(vk_id=vk_id)
+
+    async def get_users_info(self, vk_ids: list[int]) -> list[UserDC]:
+        data = await self._request(
+            "users.get",
+            {"user_ids": ",".join(str(vk_id) for vk_id in vk_ids)},
+        )
+        return [
+            UserDC(
+                vk_id=user_data["id"],
                 first_name=user_data["first_name"],
                 last_name=user_data["last_name"],
             )
+            for user_data in data["response"]
+        ]
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import typing
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any
+
+from app.store.vk_api.errors import VkApiError
+from app.store.vk_api.rate_limiter import Priority, RETRY_DELAY, backoff
+
+if typing.TYPE_CHECKING:
+    from app.store.vk_api.accessor import VkApiAccessor
+
+EXECUTE_MAX_CALLS = 25
+
+
+@dataclass
+class ApiCall:
+    method: str
+    params: dict
+    future: asyncio.Future
+    priority: int = Priority.high
+    attempt: int = 0
+
+    def to_vkscript(self) -> str:
+        params = json.dumps(self.params, ensure_ascii=False)
+        return f"API.{self.method}({params})"
+
+
+class ExecuteBatcher:
+    """
+    Collects API calls for a short window and sends them as a single
+    execute request of up to 25 calls, resolving each caller's future
+    with its own result. High priority calls are packed first, and
+    calls failed with a retryable error are sent again after a backoff.
+    Failures of the execute request itself are retried by VkApiAccessor.
+    """
+    def __init__(
+        self,
+        vk_api: "VkApiAccessor",
+        flush_interval: float,
+        max_retries: int = 5,
+        retry_delay: float = RETRY_DELAY,
+    ):
+        self.vk_api = vk_api
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.calls: dict[int, list[ApiCall]] = {
+            Priority.high: [],
+            Priority.low: [],
+        }
+        self.flush_handle: asyncio.TimerHandle | None = None
+        self.tasks: set[asyncio.Task] = set()
+        self.retries = 0
+        # execute requests waiting for a token or for the response
+        self.in_flight_batches = 0
+        self.logger = getLogger("batcher")
+
+    @property
+    def pending_calls(self) -> int:
+        return sum(len(calls) for calls in self.calls.values())
+
+    async def call(
+        self,
+        method: str,
+        params: dict,
+        priority: int = Priority.high,
+    ) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self.add(
+            ApiCall(
+                method=method,
+                params=params,
+                future=future,
+                priority=priority,
+            )
+        )
+        return await future
+
+    def add(self, call: ApiCall):
+        self.calls[call.priority].append(call)
+        if self.pending_calls >= EXECUTE_MAX_CALLS:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                self.flush_interval, self.flush
+            )
+
+    def flush(self):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        calls = self.calls[Priority.high] + self.calls[Priority.low]
+        self.calls = {Priority.high: [], Priority.low: []}
+        for index in range(0, len(calls), EXECUTE_MAX_CALLS):
+            self._run(self.send_batch(calls[index:index + EXECUTE_MAX_CALLS]))
+
+    def _run(self, coro: typing.Coroutine):
+        task = asyncio.create_task(coro)
+        task.add_done_callback(self.tasks.discard)
+        self.tasks.add(task)
+
+    async def close(self):
+        while self.pending_calls or self.tasks:
+            self.flush()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def retry(self, call: ApiCall, error: VkApiError):
+        if call.attempt >= self.max_retries:
+            call.future.set_exception(error)
+            return
+        self.retries += 1
+        self.logger.warning(
+            f"retry {call.method} in attempt {call.attempt + 1}: {error}"
+        )
+        await asyncio.sleep(
+            backoff(attempt=call.attempt, delay=self.retry_delay)
+        )
+        call.attempt += 1
+        self.add(call)
+
+    async def send_batch(self, batch: list[ApiCall]):
+        code = "return [{}];".format(
+            ",".join(call.to_vkscript() for call in batch)
+        )
+        self.in_flight_batches += 1
+        try:
+            data = await self.vk_api.execute(
+                code=code,
+                priority=min(call.priority for call in batch),
+            )
+        except Exception as e:
+            self._fail(batch=batch, error=e)
+            return
+        finally:
+            self.in_flight_batches -= 1
+
+        errors = iter(data.get("execute_errors", []))
+        for call, result in zip(batch, data["response"]):
+            if call.future.done():
+                continue
+            if result is not False:
+                call.future.set_result(result)
+                continue
+            error = VkApiError.from_dict(next(errors, {}))
+            if error.is_retryable:
+                self._run(self.retry(call=call, error=error))
+            else:
+                call.future.set_exception(error)
+
+    @staticmethod
+    def _fail(batch: list[ApiCall], error: Exception):
+        for call in batch:
+            if not call.future.done():
+                call.future.set_exception(error)
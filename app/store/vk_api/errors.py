@@ -0,0 +1,24 @@
+TOO_MANY_REQUESTS = 6
+FLOOD_CONTROL = 9
+INTERNAL_SERVER_ERROR = 10
+RETRYABLE_ERROR_CODES = (
+    TOO_MANY_REQUESTS, FLOOD_CONTROL, INTERNAL_SERVER_ERROR
+)
+
+
+class VkApiError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(f"[{code}] {message}")
+        self.code = code
+        self.message = message
+
+    @property
+    def is_retryable(self) -> bool:
+        return self.code in RETRYABLE_ERROR_CODES
+
+    @classmethod
+    def from_dict(cls, error: dict) -> "VkApiError":
+        return cls(
+            code=error.get("error_code", 0),
+            message=error.get("error_msg", ""),
+        )
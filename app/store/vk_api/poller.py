@@ -1,30 +1,129 @@
 import asyncio
+from collections import deque
 from logging import getLogger
 
 from app.store import Store
 
+# event_ids of pushed updates remembered to skip VK's redeliveries
+RECENT_EVENT_IDS = 10000
+
 
 class Poller:
-    def __init__(self, store: Store):
+    """
+    Long polls VK in one task and dispatches received batches in another,
+    so the next a_check is sent as soon as the previous one returns.
+    Keeps the ts of the last batch whose updates are all handled,
+    to resume polling from it after a restart.
+    """
+    def __init__(self, store: Store, queue_size: int = 100):
         self.store = store
         self.is_running = False
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # ts of dispatched batches with the tasks manager's
+        # queued updates count after each
+        self.dispatched: deque[tuple[int, int]] = deque()
+        self._acknowledged_ts: int | None = None
+        self.recent_event_ids: deque[str] = deque()
+        self.recent_event_ids_set: set[str] = set()
+        self.duplicate_updates = 0
+        self.dropped_updates = 0
         self.poll_task: asyncio.Task | None = None
+        self.dispatch_task: asyncio.Task | None = None
         self.logger = getLogger("poller")
 
-    async def start(self):
+    async def start(self, poll: bool = True):
+        """
+        with poll=False only dispatches batches put into the queue,
+        e.g. by the Callback API view
+        """
         self.is_running = True
-        self.poll_task = asyncio.create_task(self.poll())
-        self.poll_task.add_done_callback(self._log_task_exception)
+        if poll:
+            self.poll_task = asyncio.create_task(self.poll())
+            self.poll_task.add_done_callback(self._log_task_exception)
+        self.dispatch_task = asyncio.create_task(self.dispatch())
+        self.dispatch_task.add_done_callback(self._log_task_exception)
 
     async def stop(self):
         self.is_running = False
-        await self.poll_task
+        if self.poll_task:
+            self.poll_task.cancel()
+            await asyncio.gather(self.poll_task, return_exceptions=True)
+        if self.dispatch_task:
+            await self.queue.join()
+            self.dispatch_task.cancel()
 
     async def poll(self):
         while self.is_running:
-            updates = await self.store.vk_api.poll()
-            if updates:
-                await self.store.tasks_manager.handle_updates(updates)
+            try:
+                raw_updates = await self.store.vk_api.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error("Exception", exc_info=e)
+                await asyncio.sleep(1)
+                continue
+            if raw_updates:
+                await self.queue.put((self.store.vk_api.ts, raw_updates))
+
+    def push(self, raw_updates: list[dict]) -> bool:
+        """
+        queue updates received without a long poll ts, skipping
+        the ones already received. never waits: return False if
+        the queue is full and the updates are dropped
+        """
+        new_updates = [
+            raw_update for raw_update in raw_updates
+            if raw_update.get("event_id") not in self.recent_event_ids_set
+        ]
+        self.duplicate_updates += len(raw_updates) - len(new_updates)
+        raw_updates = new_updates
+        if not raw_updates:
+            return True
+        try:
+            self.queue.put_nowait((None, raw_updates))
+        except asyncio.QueueFull:
+            self.dropped_updates += len(raw_updates)
+            return False
+        for raw_update in raw_updates:
+            self.remember_event_id(event_id=raw_update.get("event_id"))
+        return True
+
+    def remember_event_id(self, event_id: str | None):
+        if event_id is None:
+            return
+        self.recent_event_ids.append(event_id)
+        self.recent_event_ids_set.add(event_id)
+        if len(self.recent_event_ids) > RECENT_EVENT_IDS:
+            self.recent_event_ids_set.discard(
+                self.recent_event_ids.popleft()
+            )
+
+    async def dispatch(self):
+        tasks_manager = self.store.tasks_manager
+        while True:
+            ts, raw_updates = await self.queue.get()
+            try:
+                await tasks_manager.handle_raw_updates(
+                    raw_updates=raw_updates,
+                )
+            except Exception as e:
+                self.logger.error("Exception", exc_info=e)
+            finally:
+                if ts is not None:
+                    self.dispatched.append(
+                        (ts, tasks_manager.queued_updates)
+                    )
+                    # drops the batches handled by now, so the deque
+                    # stays as short as the backlog of the tasks manager
+                    # even when no journal reads the ts
+                    self.acknowledged_ts()
+                self.queue.task_done()
+
+    def acknowledged_ts(self) -> int | None:
+        handled = self.store.tasks_manager.handled_through()
+        while self.dispatched and self.dispatched[0][1] <= handled:
+            self._acknowledged_ts, _ = self.dispatched.popleft()
+        return self._acknowledged_ts
 
     def _log_task_exception(self, task: asyncio.Task):
         try:
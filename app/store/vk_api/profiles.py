@@ -0,0 +1,111 @@
+import asyncio
+import time
+import typing
+from collections import OrderedDict
+from logging import getLogger
+
+from app.game.dataclasses import UserDC
+
+if typing.TYPE_CHECKING:
+    from app.store.vk_api.accessor import VkApiAccessor
+
+USERS_GET_MAX_IDS = 1000
+
+
+class ProfileCache:
+    """
+    LRU cache of VK profiles whose entries expire after ttl seconds
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.profiles: OrderedDict[int, tuple[float, UserDC]] = OrderedDict()
+
+    def get(self, vk_id: int) -> UserDC | None:
+        entry = self.profiles.get(vk_id)
+        if entry is None:
+            return None
+        expires_at, profile = entry
+        if expires_at < time.monotonic():
+            del self.profiles[vk_id]
+            return None
+        self.profiles.move_to_end(vk_id)
+        return profile
+
+    def set(self, profile: UserDC):
+        self.profiles[profile.vk_id] = (time.monotonic() + self.ttl, profile)
+        self.profiles.move_to_end(profile.vk_id)
+        while len(self.profiles) > self.max_size:
+            self.profiles.popitem(last=False)
+
+
+class ProfilesResolver:
+    """
+    Resolves VK profiles from the cache, gathering misses for a short
+    window into a single users.get request of up to 1000 ids.
+    """
+    def __init__(
+        self,
+        vk_api: "VkApiAccessor",
+        cache: ProfileCache,
+        flush_interval: float,
+    ):
+        self.vk_api = vk_api
+        self.cache = cache
+        self.flush_interval = flush_interval
+        self.pending: dict[int, asyncio.Future] = {}
+        self.flush_handle: asyncio.TimerHandle | None = None
+        self.tasks: set[asyncio.Task] = set()
+        self.logger = getLogger("profiles")
+
+    async def resolve(self, vk_id: int) -> UserDC | None:
+        profile = self.cache.get(vk_id)
+        if profile:
+            return profile
+
+        future = self.pending.get(vk_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.pending[vk_id] = future
+            if len(self.pending) >= USERS_GET_MAX_IDS:
+                self.flush()
+            elif self.flush_handle is None:
+                self.flush_handle = asyncio.get_running_loop().call_later(
+                    self.flush_interval, self.flush
+                )
+        return await asyncio.shield(future)
+
+    def flush(self):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        pending = list(self.pending.items())
+        self.pending = {}
+        for index in range(0, len(pending), USERS_GET_MAX_IDS):
+            task = asyncio.create_task(
+                self.fetch(dict(pending[index:index + USERS_GET_MAX_IDS]))
+            )
+            task.add_done_callback(self.tasks.discard)
+            self.tasks.add(task)
+
+    async def close(self):
+        self.flush()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def fetch(self, futures: dict[int, asyncio.Future]):
+        try:
+            profiles = await self.vk_api.get_users_info(
+                vk_ids=list(futures),
+            )
+        except Exception as e:
+            self.logger.error("Exception", exc_info=e)
+            profiles = []
+
+        for profile in profiles:
+            self.cache.set(profile)
+            future = futures.pop(profile.vk_id, None)
+            if future and not future.done():
+                future.set_result(profile)
+        for future in futures.values():
+            if not future.done():
+                future.set_result(None)
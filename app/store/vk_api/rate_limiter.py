@@ -0,0 +1,88 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+# seconds, the base of the exponential backoff of retried requests
+RETRY_DELAY = 0.5
+
+
+class Priority:
+    high = 0
+    low = 1
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every request made with the bot token.
+    Waiting requests are let through by priority, then in arrival order.
+    """
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        # a bucket below one token would never let a request through,
+        # e.g. when more workers share the token than its rate limit
+        self.capacity = max(1, burst or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.waiters: list[tuple[int, int, asyncio.Future]] = []
+        self.counter = itertools.count()
+        self.wakeup_handle: asyncio.TimerHandle | None = None
+        self.acquired = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def acquire(self, priority: int = Priority.high):
+        started_at = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), future))
+        self._release_waiters()
+        await future
+
+        wait_time = time.monotonic() - started_at
+        self.acquired += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated_at) * self.rate,
+        )
+        self.updated_at = now
+
+    def _wakeup(self):
+        self.wakeup_handle = None
+        self._release_waiters()
+
+    def _release_waiters(self):
+        self._refill()
+        while self.waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self.waiters)
+            if future.done():
+                continue
+            self.tokens -= 1
+            future.set_result(None)
+
+        if self.waiters and self.wakeup_handle is None:
+            self.wakeup_handle = asyncio.get_running_loop().call_later(
+                (1 - self.tokens) / self.rate, self._wakeup
+            )
+
+    def get_metrics(self) -> dict:
+        return dict(
+            waiting=len(self.waiters),
+            acquired=self.acquired,
+            wait_time_avg=self.wait_time_total / self.acquired
+            if self.acquired else 0.0,
+            wait_time_max=self.wait_time_max,
+        )
+
+
+def backoff(attempt: int, delay: float = RETRY_DELAY) -> float:
+    """
+    exponential delay before the given retry attempt, half of it jittered
+    """
+    delay = delay * 2 ** attempt
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -19,6 +19,7 @@ class Application(AiohttpApplication):
     config: Config | None = None
     store: Store | None = None
     database: Database | None = None
+    worker_index: int | None = None
 
 
 class Request(AiohttpRequest):
@@ -48,7 +49,11 @@ class View(AiohttpView):
 app = Application()
 
 
-def setup_app(config_path: str) -> Application:
+def setup_app(
+    config_path: str,
+    worker_index: int | None = None,
+) -> Application:
+    app.worker_index = worker_index
     setup_logging(app)
     setup_config(app, config_path)
     session_setup(app, EncryptedCookieStorage(app.config.session.key))
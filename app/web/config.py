@@ -22,6 +22,31 @@ class AdminConfig:
 class BotConfig:
     token: str
     group_id: int
+    api_url: str = "https://api.vk.com/method/"
+    max_concurrent_updates: int = 100
+    max_pending_updates: int = 1000
+    poller_queue_size: int = 100
+    execute_flush_interval: float = 0.05
+    api_rate_limit: float = 20
+    api_max_retries: int = 5
+    # VK requests waiting for a rate limiter token or a response
+    timer_congestion_threshold: int = 10
+    profile_cache_size: int = 10000
+    profile_cache_ttl: int = 3600
+    recent_questions_per_chat: int = 50
+    workers: int = 1
+    mode: str = "long_poll"
+    callback_secret: str | None = None
+    callback_confirmation: str | None = None
+    ipc_dir: str = "/tmp/vkbot"
+    state_flush_interval: float = 0.1
+    state_flush_size: int = 500
+    state_flush_max_retries: int = 5
+    state_sync_timeout: float = 5.0
+    # game events are journaled here for crash recovery,
+    # None turns the journal and the snapshots off
+    state_journal_dir: str | None = "journal"
+    state_snapshot_interval: float = 5.0
 
 
 @dataclass
@@ -31,6 +56,19 @@ class DatabaseConfig:
     user: str = "postgres"
     password: str = "postgres"
     database: str = "project"
+    pool_size: int = 10
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_pre_ping: bool = True
+    statement_cache_size: int = 100
+    command_timeout: float = 30
+
+
+@dataclass
+class TracingConfig:
+    enabled: bool = True
+    trace_log: str | None = None
+    flush_interval: float = 1.0
 
 
 @dataclass
@@ -39,6 +77,7 @@ class Config:
     session: SessionConfig = None
     bot: BotConfig = None
     database: DatabaseConfig = None
+    tracing: TracingConfig = None
 
 
 def setup_config(app: "Application", config_path: str):
@@ -53,9 +92,7 @@ def setup_config(app: "Application", config_path: str):
             email=raw_config["admin"]["email"],
             password=raw_config["admin"]["password"],
         ),
-        bot=BotConfig(
-            token=raw_config["bot"]["token"],
-            group_id=raw_config["bot"]["group_id"],
-        ),
+        bot=BotConfig(**raw_config["bot"]),
         database=DatabaseConfig(**raw_config["database"]),
+        tracing=TracingConfig(**raw_config.get("tracing", {})),
     )
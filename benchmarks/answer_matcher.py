@@ -0,0 +1,71 @@
+"""
+Match cost per chat message against a question bank of 100k answers.
+
+    python -m benchmarks.answer_matcher
+"""
+import random
+import time
+
+from app.game.dataclasses import AnswerDC, QuestionDC
+from app.store.bot.matcher import AnswerMatcher
+
+ANSWERS_COUNT = 100_000
+ANSWERS_PER_QUESTION = 3
+MESSAGES_COUNT = 100_000
+WORDS = (
+    "ёлка", "машина", "красная", "площадь", "кошка", "собака", "дом",
+    "море", "солнце", "снег", "автомобиль", "подарок", "праздник",
+)
+
+
+def make_title(rnd: random.Random, index: int) -> str:
+    return f"{index} " + " ".join(rnd.sample(WORDS, 2))
+
+
+def main():
+    rnd = random.Random(0)
+    questions = []
+    for question_id in range(ANSWERS_COUNT // ANSWERS_PER_QUESTION):
+        answers = [
+            AnswerDC(
+                id=question_id * ANSWERS_PER_QUESTION + i,
+                title=make_title(rnd, question_id * ANSWERS_PER_QUESTION + i),
+                score=rnd.randint(1, 50),
+                question_id=question_id,
+            )
+            for i in range(ANSWERS_PER_QUESTION)
+        ]
+        questions.append(
+            QuestionDC(id=question_id, title=str(question_id), answers=answers)
+        )
+
+    started_at = time.perf_counter()
+    matchers = [AnswerMatcher(answers=q.answers) for q in questions]
+    build_time = time.perf_counter() - started_at
+
+    messages = []
+    for _ in range(MESSAGES_COUNT):
+        index = rnd.randrange(len(questions))
+        answer = rnd.choice(questions[index].answers)
+        text = rnd.choice((
+            answer.title.upper().replace("Е", "Ё") + "!",
+            answer.title[:-1] + "ы",
+            "просто сообщение в чате",
+        ))
+        messages.append((matchers[index], text))
+
+    matched = 0
+    started_at = time.perf_counter()
+    for matcher, text in messages:
+        if matcher.match(text=text):
+            matched += 1
+    match_time = time.perf_counter() - started_at
+
+    print(f"answers: {ANSWERS_COUNT}, questions: {len(questions)}")
+    print(f"index build: {build_time * 1000:.1f} ms")
+    print(f"messages: {MESSAGES_COUNT}, matched: {matched}")
+    print(f"match cost: {match_time / MESSAGES_COUNT * 1e6:.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Query plans of the hot bot lookups before and after the
+4f1c2a7d9e31 indexes migration. Run against a scratch database:
+
+    python -m benchmarks.query_plans --seed 100000
+
+The database from alembic.ini is migrated down to 66221b312dd1,
+optionally seeded, explained, migrated up again and explained again.
+"""
+import argparse
+import asyncio
+import json
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+BEFORE_REVISION = "66221b312dd1"
+AFTER_REVISION = "4f1c2a7d9e31"
+
+QUERIES = {
+    "active game by peer_id": (
+        "SELECT * FROM games WHERE peer_id = :peer_id AND in_process"
+    ),
+    "active games": "SELECT * FROM games WHERE in_process",
+    "user by vk_id": "SELECT * FROM users WHERE vk_id = :vk_id",
+    "player statistics": (
+        "SELECT * FROM statistics WHERE game_id = :game_id "
+        "AND user_id = :user_id"
+    ),
+    "active roadmap": (
+        "SELECT * FROM roadmaps WHERE game_id = :game_id AND status = 1"
+    ),
+    "answer by title": (
+        "SELECT * FROM answers WHERE question_id = :question_id "
+        "AND title = :title"
+    ),
+}
+PARAMS = dict(
+    peer_id=2000000001, vk_id=1, game_id=1, user_id=1,
+    question_id=1, title="answer 1",
+)
+
+SEED = """
+INSERT INTO questions (title)
+SELECT 'question ' || n FROM generate_series(1, :rows / 10) n;
+INSERT INTO answers (title, question_id, score)
+SELECT 'answer ' || n, n % (:rows / 10) + 1, 10
+FROM generate_series(1, :rows) n;
+INSERT INTO users (vk_id) SELECT n FROM generate_series(1, :rows) n;
+INSERT INTO games (peer_id, started_at, in_process)
+SELECT 2000000000 + n, now(), n % 100 = 0
+FROM generate_series(1, :rows) n;
+INSERT INTO statistics (game_id, user_id, is_creator, points, failures,
+                        is_lost, is_winner)
+SELECT n, n, true, 0, 0, false, false FROM generate_series(1, :rows) n;
+INSERT INTO roadmaps (game_id, question_id, status)
+SELECT n / 5 + 1, n % (:rows / 10) + 1, (n % 5 = 0)::int
+FROM generate_series(0, :rows - 1) n;
+ANALYZE;
+"""
+
+
+async def explain(url: str) -> dict[str, dict]:
+    engine = create_async_engine(url)
+    plans = {}
+    async with engine.connect() as connection:
+        for name, query in QUERIES.items():
+            result = await connection.execute(
+                text(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}"),
+                {k: v for k, v in PARAMS.items() if f":{k}" in query},
+            )
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            plans[name] = plan[0]
+    await engine.dispose()
+    return plans
+
+
+async def seed(url: str, rows: int):
+    engine = create_async_engine(url)
+    async with engine.begin() as connection:
+        for statement in SEED.split(";"):
+            if statement.strip():
+                await connection.execute(text(statement), {"rows": rows})
+    await engine.dispose()
+
+
+def describe(plan: dict) -> str:
+    node = plan["Plan"]
+    index = node.get("Index Name", "-")
+    return (
+        f"{node['Node Type']:<20} index={index:<30} "
+        f"time={plan['Execution Time']:.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="alembic.ini")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    alembic_config = Config(args.config)
+    url = alembic_config.get_main_option("sqlalchemy.url")
+
+    command.downgrade(alembic_config, BEFORE_REVISION)
+    if args.seed:
+        asyncio.run(seed(url=url, rows=args.seed))
+    before = asyncio.run(explain(url=url))
+    command.upgrade(alembic_config, AFTER_REVISION)
+    after = asyncio.run(explain(url=url))
+
+    for name in QUERIES:
+        print(name)
+        print(f"  before: {describe(before[name])}")
+        print(f"  after:  {describe(after[name])}")
+
+
+if __name__ == "__main__":
+    main()
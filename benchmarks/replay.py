@@ -0,0 +1,346 @@
+"""
+End-to-end replay of long poll traffic through the bot, against a fake
+VK API served locally and the database from the config. Every scenario
+runs in its own process:
+
+    python -m benchmarks.replay --config config.yml --games 1 100 10000
+
+Each game chat is created with /create, then answered for every question
+while noise chats send plain messages in between. Use a scratch database,
+questions are seeded into it when the bank cannot fill a game.
+Pass --no-tracing to measure the overhead of span tracing.
+"""
+import argparse
+import asyncio
+import json
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+
+from aiohttp import web
+from sqlalchemy import event
+
+from app.game.dataclasses import AnswerDC
+from app.store.bot.constants import (
+    BotTextCommands, JOIN_TIME_SECONDS, QUESTIONS_PER_GAME
+)
+from app.store.bot.updates import get_peer_id
+from app.web.app import Application, setup_app
+
+GAME_PEERS = 2000000000
+NOISE_PEERS = 3000000000
+POLL_BATCH_SIZE = 100
+SEED_QUESTIONS = 50
+ROUND_TIMEOUT = 120
+API_RATE_LIMIT = 10 ** 6
+CALL_PREFIX = re.compile(r"API\.([\w.]+)\(")
+
+
+def parse_execute(code: str):
+    decoder = json.JSONDecoder()
+    position = 0
+    while match := CALL_PREFIX.search(code, position):
+        params, position = decoder.raw_decode(code, match.end())
+        yield match.group(1), params
+
+
+def make_message(peer_id: int, from_id: int, text: str, cmd: int) -> dict:
+    return {
+        "type": "message_new",
+        "event_id": str(cmd),
+        "object": {
+            "message": {
+                "from_id": from_id,
+                "peer_id": peer_id,
+                "text": text,
+                "conversation_message_id": cmd,
+            },
+        },
+    }
+
+
+def percentile(values: list[float], share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+class FakeVk:
+    """
+    Serves queued updates through a_check and answers the API methods
+    the bot calls, timing the first reply to every awaited update
+    """
+    def __init__(self, url: str):
+        self.url = url
+        self.batches: asyncio.Queue = asyncio.Queue()
+        self.awaited: dict[int, deque[float]] = {}
+        self.outstanding = 0
+        self.replied = asyncio.Event()
+        self.latencies: list[float] = []
+        self.calls = 0
+        self.requests = 0
+        self.ts = 0
+        self.cmd = 0
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/method/{method}", self.handle_method)
+        app.router.add_get("/poll", self.handle_poll)
+        return app
+
+    def reset(self):
+        self.latencies.clear()
+        self.calls = 0
+        self.requests = 0
+
+    async def replay(self, updates: list[tuple[dict, bool]]):
+        """
+        deliver updates in a_check batches and wait for a reply
+        to every update marked as awaited
+        """
+        self.outstanding += sum(awaited for _, awaited in updates)
+        self.replied.clear()
+        for index in range(0, len(updates), POLL_BATCH_SIZE):
+            self.batches.put_nowait(updates[index:index + POLL_BATCH_SIZE])
+        if self.outstanding:
+            await asyncio.wait_for(self.replied.wait(), ROUND_TIMEOUT)
+
+    async def handle_poll(self, request: web.Request) -> web.Response:
+        try:
+            batch = await asyncio.wait_for(
+                self.batches.get(),
+                timeout=float(request.query.get("wait", 25)),
+            )
+        except asyncio.TimeoutError:
+            batch = []
+        received_at = time.perf_counter()
+        for raw_update, awaited in batch:
+            if awaited:
+                peer_id = get_peer_id(raw_update=raw_update)
+                self.awaited.setdefault(peer_id, deque()).append(received_at)
+        self.ts += 1
+        return web.json_response({
+            "ts": self.ts,
+            "updates": [raw_update for raw_update, _ in batch],
+        })
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(request.query)
+        params.update(await request.post())
+        self.requests += 1
+        if method == "groups.getLongPollServer":
+            return web.json_response({"response": {
+                "key": "key",
+                "server": self.url + "/poll",
+                "ts": self.ts,
+            }})
+        if method == "execute":
+            calls = list(parse_execute(params["code"]))
+            self.calls += len(calls)
+            return web.json_response({"response": [
+                self.call(method=method, params=params)
+                for method, params in calls
+            ]})
+        self.calls += 1
+        return web.json_response(
+            {"response": self.call(method=method, params=params)}
+        )
+
+    def call(self, method: str, params: dict):
+        if method == "users.get":
+            return [
+                {"id": int(vk_id), "first_name": "user", "last_name": vk_id}
+                for vk_id in params["user_ids"].split(",")
+            ]
+        if method == "messages.send":
+            peer_id = int(params["peer_ids"])
+            self.reply(peer_id=peer_id)
+            self.cmd += 1
+            return [{"peer_id": peer_id, "conversation_message_id": self.cmd}]
+        return 1
+
+    def reply(self, peer_id: int):
+        awaited = self.awaited.get(peer_id)
+        if not awaited:
+            return
+        self.latencies.append(time.perf_counter() - awaited.popleft())
+        self.outstanding -= 1
+        if not self.outstanding:
+            self.replied.set()
+
+
+async def seed_questions(app: Application):
+    if app.store.question_bank.size >= QUESTIONS_PER_GAME:
+        return
+    async with app.database.unit_of_work():
+        for index in range(SEED_QUESTIONS):
+            title = f"replay question {index}"
+            question = await app.store.game.get_question_by_title(
+                title=title,
+            )
+            if question is None:
+                question = await app.store.game.create_question(
+                    title=title,
+                    answers=[
+                        AnswerDC(title=f"answer {index} {n}", score=10 * n)
+                        for n in range(1, 4)
+                    ],
+                )
+            app.store.question_bank.put(question=question)
+
+
+def make_round(
+    app: Application,
+    games: int,
+    noise: int,
+    round_index: int,
+) -> list[tuple[dict, bool]]:
+    updates = []
+    for index in range(games):
+        peer_id = GAME_PEERS + index + 1
+        game = app.store.state.get_game(peer_id=peer_id)
+        if game is None or game.active_question is None:
+            continue
+        # right and wrong answers take turns
+        text = "wrong answer"
+        if round_index % 2 == 0:
+            text = game.active_question.answers[0].title
+        updates.append((
+            make_message(
+                peer_id=peer_id,
+                from_id=index + 1,
+                text=text,
+                cmd=round_index + 1,
+            ),
+            True,
+        ))
+        for n in range(noise):
+            updates.append((
+                make_message(
+                    peer_id=NOISE_PEERS + index * noise + n,
+                    from_id=index + 1,
+                    text="just chatting",
+                    cmd=round_index + 1,
+                ),
+                False,
+            ))
+    return updates
+
+
+async def run_scenario(
+    config_path: str,
+    games: int,
+    noise: int,
+    port: int,
+    tracing: bool,
+):
+    fake_vk = FakeVk(url=f"http://127.0.0.1:{port}")
+    fake_runner = web.AppRunner(fake_vk.make_app())
+    await fake_runner.setup()
+    await web.TCPSite(fake_runner, "127.0.0.1", port).start()
+
+    app = setup_app(config_path=config_path)
+    app.config.bot.api_url = fake_vk.url + "/method/"
+    app.config.bot.api_rate_limit = API_RATE_LIMIT
+    app.config.bot.mode = "long_poll"
+    app.config.bot.workers = 1
+    app.store.tracing.enabled = tracing
+    # a fresh journal, so no games of an earlier run are recovered
+    journal_dir = tempfile.mkdtemp()
+    app.config.bot.state_journal_dir = journal_dir
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await seed_questions(app)
+        await fake_vk.replay([
+            (
+                make_message(
+                    peer_id=GAME_PEERS + index + 1,
+                    from_id=index + 1,
+                    text=BotTextCommands.create_game,
+                    cmd=0,
+                ),
+                True,
+            )
+            for index in range(games)
+        ])
+        # countdowns end and the first questions are sent
+        await asyncio.sleep(JOIN_TIME_SECONDS + 1)
+
+        queries = [0]
+
+        def count_query(*args):
+            queries[0] += 1
+
+        engine = app.database._engine.sync_engine
+        event.listen(engine, "before_cursor_execute", count_query)
+        fake_vk.reset()
+        updates_count = 0
+        started_at = time.perf_counter()
+        for round_index in range(QUESTIONS_PER_GAME):
+            updates = make_round(
+                app=app,
+                games=games,
+                noise=noise,
+                round_index=round_index,
+            )
+            updates_count += len(updates)
+            await fake_vk.replay(updates)
+        elapsed = time.perf_counter() - started_at
+        await app.store.state.events.sync()
+        event.remove(engine, "before_cursor_execute", count_query)
+    finally:
+        await runner.cleanup()
+        await fake_runner.cleanup()
+        shutil.rmtree(journal_dir, ignore_errors=True)
+
+    latencies = fake_vk.latencies or [0.0]
+    print(
+        f"games={games} updates={updates_count} "
+        f"{updates_count / elapsed:.0f} updates/s "
+        f"p50={percentile(latencies, 0.5) * 1000:.1f} ms "
+        f"p99={percentile(latencies, 0.99) * 1000:.1f} ms "
+        f"queries/update={queries[0] / updates_count:.3f} "
+        f"calls/update={fake_vk.calls / updates_count:.3f} "
+        f"requests/update={fake_vk.requests / updates_count:.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.yml")
+    parser.add_argument("--games", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--noise", type=int, default=9)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-tracing", action="store_true")
+    args = parser.parse_args()
+
+    if len(args.games) == 1:
+        asyncio.run(run_scenario(
+            config_path=args.config,
+            games=args.games[0],
+            noise=args.noise,
+            port=args.port,
+            tracing=not args.no_tracing,
+        ))
+        return
+    for games in args.games:
+        subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.replay",
+                "--config", args.config,
+                "--games", str(games),
+                "--noise", str(args.noise),
+                "--port", str(args.port),
+                *(["--no-tracing"] if args.no_tracing else []),
+            ],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Memory allocated while parsing a long poll update stream, with and
+without the Game/User helpers a handler attaches. Replays a recorded
+stream (a JSON list of raw updates) or a synthetic chat flood:
+
+    python -m benchmarks.update_allocations [--stream updates.json]
+"""
+import argparse
+import json
+import random
+import tracemalloc
+
+from app.store.bot.updates import parse_updates
+
+UPDATES_COUNT = 100_000
+CHATS_COUNT = 1_000
+EVENTS_SHARE = 0.05
+
+
+def make_stream(count: int) -> list[dict]:
+    rnd = random.Random(0)
+    stream = []
+    for event_id in range(count):
+        peer_id = 2000000000 + rnd.randrange(CHATS_COUNT)
+        user_id = rnd.randrange(1, 100_000)
+        if rnd.random() < EVENTS_SHARE:
+            stream.append({
+                "type": "message_event",
+                "event_id": str(event_id),
+                "object": {
+                    "user_id": user_id,
+                    "peer_id": peer_id,
+                    "event_id": str(event_id),
+                    "payload": {"type": "join"},
+                },
+            })
+            continue
+        stream.append({
+            "type": "message_new",
+            "event_id": str(event_id),
+            "object": {
+                "message": {
+                    "from_id": user_id,
+                    "peer_id": peer_id,
+                    "text": f"message {event_id}",
+                    "conversation_message_id": event_id,
+                },
+            },
+        })
+    return stream
+
+
+def measure(stream: list[dict], attach: bool) -> tuple[int, int]:
+    tracemalloc.start()
+    updates = parse_updates(app=None, raw_updates=stream)
+    if attach:
+        # what every update paid before the helpers became lazy
+        for update in updates:
+            _ = update.game
+            _ = update.user
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stream")
+    args = parser.parse_args()
+
+    if args.stream:
+        with open(args.stream) as file:
+            stream = json.load(file)
+    else:
+        stream = make_stream(UPDATES_COUNT)
+
+    for name, attach in (("records only", False), ("with helpers", True)):
+        size, peak = measure(stream=stream, attach=attach)
+        print(
+            f"{name:<14} {size / len(stream):8.1f} B/update "
+            f"peak={peak / 2 ** 20:.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
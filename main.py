@@ -1,13 +1,43 @@
 import os
+import multiprocessing
 
 from app.web.app import setup_app
 from aiohttp.web import run_app
 
-if __name__ == "__main__":
+CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "config.yml"
+)
+
+
+def run_worker(worker_index: int):
+    app = setup_app(config_path=CONFIG_PATH, worker_index=worker_index)
+    os.makedirs(app.config.bot.ipc_dir, exist_ok=True)
     run_app(
-        setup_app(
-            config_path=os.path.join(
-                os.path.dirname(os.path.realpath(__file__)), "config.yml"
-            )
-        )
+        app,
+        path=os.path.join(
+            app.config.bot.ipc_dir, f"worker-{worker_index}-http.sock"
+        ),
+        print=None,
     )
+
+
+if __name__ == "__main__":
+    app = setup_app(config_path=CONFIG_PATH)
+
+    # with bot.workers > 1 this process only receives updates
+    # and shards them between the worker processes by peer_id
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=run_worker, args=(worker_index,), daemon=True)
+        for worker_index in range(app.config.bot.workers)
+        if app.config.bot.workers > 1
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        run_app(app)
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
@@ -0,0 +1,19 @@
+import asyncio
+
+from app.store.vk_api.rate_limiter import RateLimiter
+
+
+def test_fractional_rate_lets_requests_through():
+    # 32 workers sharing a token limited to 20 requests per second
+    rate = 20 / 32
+
+    async def acquire_twice() -> float:
+        limiter = RateLimiter(rate=rate)
+        await asyncio.wait_for(limiter.acquire(), timeout=0.1)
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        await asyncio.wait_for(limiter.acquire(), timeout=2 / rate)
+        return loop.time() - started_at
+
+    waited = asyncio.run(acquire_twice())
+    assert waited >= 1 / rate * 0.9